@@ -71,3 +71,90 @@ ARABIC_MAPPING = {
 EGYPT_GOVS_V2 = ['الإسماعيليه', 'البحر الأحمر', 'جنوب سيناء', 'بني سويف', 'بور سعيد', 'الشرقيه', 'شمال سيناء', 'الغربيه', 'الفيوم',
                  'القليوبيه', 'المنوفيه', 'الوادى الجديد', 'البحيرة', 'دمياط', 'السويس', 'قنا', 'مرسى مطروح', 'كفر الشيخ', 'الأقصر', 'الدقهلية',
                  'القاهرة', 'الاسكندريه', 'الجيزه', 'المنيا', 'سوهاج', 'أسوان', 'أسيوط']
+
+# List of all Egyptian governments with the ways to write them, the alef/hamza,
+# ة/ه and ى/ي variants are folded by arabic_normalize.normalize
+EGYPT_GOVS = [
+    'الاسكندريه', 'اسيوط', 'اسوان', 'سوهاج', 'المنيا', 'منيا', 'الجيزه', 'جيزه', 'القاهره',
+    'قاهره', 'الدقهليه', 'دقهليه', 'الاقصر', 'اقصر', 'كفر الشيخ', 'مرسي مطروح', 'مطروح', 'قنا',
+    'السويس', 'دمياط', 'جنوب سيناء', 'البحيره', 'بحيره', 'الوادي الجديد', 'المنوفيه', 'منوفيه',
+    'القليوبيه', 'قليوبيه', 'الفيوم', 'فيوم', 'الغربيه', 'غربيه', 'شمال سيناء', 'شمال سينا',
+    'جنوب سينا', 'الشرقيه', 'شرقيه', 'بور سعيد', 'بني سويف', 'البحر الاحمر', 'بحر احمر',
+    'الاسماعيليه', 'اسماعيليه', 'الاسماعليه', 'اسماعليه'
+]
+
+# Governments in the normalized form of arabic_normalize.normalize mapped to English
+GOVS_MAPPING = {
+    'اسيوط': 'Assiut',
+    'الجيزه': 'Giza',
+    'جيزه': 'Giza',
+    'اسوان': 'Aswan',
+    'الاسكندريه': 'Alexandria',
+    'اسكندريه': 'Alexandria',
+    'المنيا': 'Minya',
+    'منيا': 'Minya',
+    'القاهره': 'Cairo',
+    'قاهره': 'Cairo',
+    'الدقهليه': 'Dakahlia',
+    'دقهليه': 'Dakahlia',
+    'سوهاج': 'Sohag',
+    'الغربيه': 'Gharbia',
+    'غربيه': 'Gharbia',
+    'البحيره': 'Beheira',
+    'بحيره': 'Beheira',
+    'القليوبيه': 'Qualyubia',
+    'قليوبيه': 'Qualyubia',
+    'الشرقيه': 'Al-Sharqia',
+    'شرقيه': 'Al-Sharqia',
+    'المنوفيه': 'Menofia',
+    'منوفيه': 'Menofia',
+    'بني سويف': 'Beni Suef',
+    'سويف': 'Beni Suef',
+    'قنا': 'Qena',
+    'بور سعيد': 'Port Said',
+    'بور': 'Port Said',
+    'سعيد': 'Port Said',
+    'البحر الاحمر': 'Red Sea',
+    'بحر احمر': 'Red Sea',
+    'البحر': 'Red Sea',
+    'الاحمر': 'Red Sea',
+    'احمر': 'Red Sea',
+    'دمياط': 'Damietta',
+    'الفيوم': 'Fayoum',
+    'فيوم': 'Fayoum',
+    'كفر الشيخ': 'Kafr el-Sheikh',
+    'كفر شيخ': 'Kafr el-Sheikh',
+    'كفر': 'Kafr el-Sheikh',
+    'شيخ': 'Kafr el-Sheikh',
+    'الشيخ': 'Kafr el-Sheikh',
+    'مرسي مطروح': 'Matrouh',
+    'مطروح': 'Matrouh',
+    'مرسي': 'Matrouh',
+    'المرسي': 'Matrouh',
+    'الوادي الجديد': 'New Valley',
+    'وادي': 'New Valley',
+    'الوادي': 'New Valley',
+    'الجديد': 'New Valley',
+    'جديد': 'New Valley',
+    'شمال سيناء': 'North Sinai',
+    'شمال سينا': 'North Sinai',
+    'شمال': 'North Sinai',
+    'الشمال': 'North Sinai',
+    'جنوب سيناء': 'South Sinai',
+    'جنوب سينا': 'South Sinai',
+    'جنوب': 'South Sinai',
+    'الجنوب': 'South Sinai',
+    'سيناء': 'North Sinai',
+    'سينا': 'North Sinai',
+    'السويس': 'Suez',
+    'سويس': 'Suez',
+    'قناه السويس': 'Suez',
+    'القناه': 'Suez',
+    'الاقصر': 'Luxor',
+    'اقصر': 'Luxor',
+    'الاسماعيليه': 'Ismailia',
+    'اسماعيليه': 'Ismailia',
+    'الاسماعليه': 'Ismailia',
+    'اسماعليه': 'Ismailia',
+    'مفقود': 'Null',
+}
@@ -0,0 +1,85 @@
+from arabic_content import GOVS_MAPPING
+
+# the variants folded into one letter
+FOLDED = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي',
+    'ة': 'ه',
+    'ى': 'ي',
+    # the persian yeh and keheh typed on some keyboards
+    '\u06cc': 'ي', '\u06a9': 'ك',
+}
+# tatweel, diacritics, quranic marks and the invisible direction/width marks
+DELETED = ['\u0640', '\u0670'] + [chr(c) for c in range(0x064B, 0x0660)] \
+    + [chr(c) for c in range(0x0610, 0x061B)] + [chr(c) for c in range(0x06D6, 0x06EE) if c not in (0x06DE, 0x06E9)] \
+    + ['\u061c', '\u200b', '\u200c', '\u200d', '\u200e', '\u200f', '\ufeff']
+
+# a list indexed by the code point is looked up faster than a dict by str.translate,
+# the characters past its end raise IndexError and are kept
+NORMALIZE_TABLE = list(range(0xFEFF + 1))
+for code, value in str.maketrans({**FOLDED, **{c: None for c in DELETED}}).items():
+    NORMALIZE_TABLE[code] = value
+
+
+def normalize(text):
+    """
+    Normalize arabic text for lookups and comparisons: fold the alef/hamza
+    forms, ة into ه and ى into ي, strip tatweel, diacritics and invisible
+    marks, and collapse the spaces
+
+    Args:
+        text (str): the arabic text
+
+    Returns:
+        text (str): the normalized text
+    """
+    return ' '.join(text.translate(NORMALIZE_TABLE).split())
+
+
+def normalize_many(texts):
+    """
+    Normalize a batch of texts
+
+    Args:
+        texts (list or pandas Series): the texts, the values that are not
+            strings (None/NaN) are kept
+
+    Returns:
+        texts (list or pandas Series): the normalized texts, a Series keeps its index
+    """
+    result = [normalize(text) if isinstance(text, str) else text for text in texts]
+    if type(texts).__name__ == 'Series':
+        import pandas as pd
+        return pd.Series(result, index=texts.index, name=texts.name, dtype=object)
+    return result
+
+
+class NormalizedLookup:
+    """
+    Dict lookup on normalized keys: every spelling variant of a key is found
+    with one dict access on its normalized form
+
+    Args:
+        mapping (dict): key -> value, the first key wins when two keys have
+            the same normalized form
+    """
+
+    def __init__(self, mapping):
+        self.mapping = {}
+        for key, value in mapping.items():
+            self.mapping.setdefault(normalize(key), value)
+
+    def get(self, text, default=None):
+        return self.mapping.get(normalize(text), default)
+
+    def __getitem__(self, text):
+        return self.mapping[normalize(text)]
+
+    def __contains__(self, text):
+        return normalize(text) in self.mapping
+
+    def __len__(self):
+        return len(self.mapping)
+
+
+GOV_LOOKUP = NormalizedLookup(GOVS_MAPPING)
@@ -0,0 +1,67 @@
+"""
+Benchmark of the date and age parsing: the row by row steps of clean_json.ipynb
+against the vectorized date_parsing functions, on the raw texts of the scraper
+rebuilt from the dataset and repeated to the given number of rows.
+
+Usage: python bench_date_parsing.py [dataset json] [rows]
+"""
+import re
+import sys
+import warnings
+from time import perf_counter
+
+import pandas as pd
+
+from date_parsing import parse_dates, parse_ages, arabic_dates
+
+DATASET = '../../analysis/atfal_missing_people.json'
+# the labels before the values on the person page, as long as the notebook slices
+DATE_LABEL = 'تاريخ الفقد  : '
+AGE_LABEL = 'العمر الحالى للطفل (تقريبا)  :  '
+
+
+def notebook(df):
+    df = df.copy()
+    df["missing_date"] = df["missing_date"].apply(lambda x: x[15:])
+    df["missing_date_ar"] = df["missing_date"].apply(lambda x: "-".join(list(map(str, re.findall(r'\d+', x)))))
+    with warnings.catch_warnings():
+        # pandas can't infer one format and parses every element alone
+        warnings.simplefilter('ignore')
+        df['missing_date_en'] = pd.to_datetime(df.missing_date_ar, errors='coerce')
+    df["current_age"] = df["current_age"].apply(lambda x: x[32:])
+    df["current_age"] = df["current_age"].astype(int)
+    return df
+
+
+def vectorized(df):
+    df = df.copy()
+    df['missing_date_ar'] = arabic_dates(df['missing_date'])
+    df['missing_date_en'], date_report = parse_dates(df['missing_date'])
+    df['current_age'], age_report = parse_ages(df['current_age'])
+    return df, pd.concat([date_report, age_report])
+
+
+if __name__ == '__main__':
+    assert len(DATE_LABEL) == 15 and len(AGE_LABEL) == 32
+    path = sys.argv[1] if len(sys.argv) > 1 else DATASET
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    data = pd.read_json(path)
+    raw = pd.DataFrame({'missing_date': DATE_LABEL + data['missing_date'],
+                        'current_age': AGE_LABEL + data['current_age'].astype(str)})
+    raw = pd.concat([raw] * (rows // len(raw) + 1), ignore_index=True).iloc[:rows]
+    print(f"{len(raw)} rows")
+
+    t0 = perf_counter()
+    expected = notebook(raw)
+    print(f"{'notebook':<12} {perf_counter() - t0:8.3f}s")
+    t0 = perf_counter()
+    result, report = vectorized(raw)
+    print(f"{'vectorized':<12} {perf_counter() - t0:8.3f}s")
+
+    print(f"unparseable rows: {len(report)}")
+    print(report['reason'].value_counts().to_string())
+    parsed = result['missing_date_en'].notna() & expected['missing_date_en'].notna()
+    swapped = (result['missing_date_en'] != expected['missing_date_en']) & parsed
+    # the notebook parses the ambiguous dates month first
+    print(f"dates differing from the notebook: {swapped.sum()} (month and day swapped)")
+    print(f"ages differing from the notebook: {(result['current_age'] != expected['current_age']).sum()}")
@@ -0,0 +1,65 @@
+"""
+Scale benchmark of find_near_duplicates: synthetic records built from the name
+parts, governments and years of the dataset, with a share of them planted as
+misspelled copies (one letter replaced, inserted or deleted) of an earlier
+record in the same block. Reports the time and how many copies were found.
+
+Usage: python bench_near_duplicates.py [records] [dataset json]
+"""
+import sys
+import random
+from time import perf_counter
+
+import pandas as pd
+
+from near_duplicates import find_near_duplicates
+
+DATASET = '../../analysis/atfal_missing_people.json'
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+
+def misspell(name, rng):
+    name = list(name)
+    k = rng.randrange(len(name))
+    op = rng.random()
+    if op < 0.4:
+        name[k] = rng.choice(LETTERS)
+    elif op < 0.7:
+        name.insert(k, rng.choice(LETTERS))
+    elif len(name) > 8:
+        del name[k]
+    return ''.join(name)
+
+
+def synthetic_records(data, size, copies=0.1, seed=0):
+    rng = random.Random(seed)
+    parts = [part for name in data['name_arabic'] for part in name.split()]
+    govs = list(data['government_english'].unique())
+    years = list(range(1990, 2022))
+    rows = []
+    copy_of = {}
+    for i in range(size):
+        if rows and rng.random() < copies:
+            original = rng.randrange(max(0, i - 5000), i)
+            name, gov, year = rows[original]
+            rows.append((misspell(name, rng), gov, year))
+            copy_of[i] = original
+        else:
+            rows.append((' '.join(rng.choice(parts) for _ in range(4)), rng.choice(govs), rng.choice(years)))
+    return pd.DataFrame(rows, columns=['name_arabic', 'government_english', 'year']), copy_of
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = sys.argv[2] if len(sys.argv) > 2 else DATASET
+    df, copy_of = synthetic_records(pd.read_json(path), size)
+
+    t0 = perf_counter()
+    clusters = find_near_duplicates(df)
+    elapsed = perf_counter() - t0
+
+    cluster = clusters['cluster'].to_dict()
+    found = sum(1 for i, original in copy_of.items() if i in cluster and cluster[i] == cluster.get(original))
+    print(f"{len(df)} records in {elapsed:.1f}s")
+    print(f"{clusters['cluster'].nunique()} clusters of {len(clusters)} records")
+    print(f"planted copies found: {found}/{len(copy_of)} ({100 * found / len(copy_of):.1f}%)")
@@ -0,0 +1,142 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+def journal_path_of(root):
+    """
+    Path of the rename journal of a folder: next to it, like the inventory index
+    """
+    return os.path.normpath(root) + '.rename-journal.jsonl'
+
+
+def plan_renames(folders, mapping, existing=None):
+    """
+    Plan the renames of the folders before touching the disk
+
+    Args:
+        folders (list): names of the folders to rename
+        mapping (dict): folder name -> new name
+        existing (iterable, optional): names already in the folder, the
+            folders by default
+
+    Returns:
+        plan (list): (old, new) pairs that can be renamed in any order
+        skipped (pandas DataFrame): folder, target and reason of the folders
+            left as they are: 'no id', 'already renamed', 'collision' (several
+            folders with the same target) or 'target exists'
+    """
+    existing = set(folders if existing is None else existing)
+    targets = {}
+    skipped = []
+    for folder in folders:
+        target = mapping.get(folder)
+        if target is None or pd.isna(target):
+            skipped.append((folder, None, 'no id'))
+            continue
+        target = str(target)
+        if target == folder:
+            skipped.append((folder, target, 'already renamed'))
+        elif target in existing:
+            # the target is another folder, even if it is renamed too: renaming
+            # in any order (and in parallel) needs free targets
+            skipped.append((folder, target, 'target exists'))
+        else:
+            targets.setdefault(target, []).append(folder)
+    plan = []
+    for target, sources in targets.items():
+        if len(sources) > 1:
+            skipped.extend((folder, target, 'collision') for folder in sources)
+        else:
+            plan.append((sources[0], target))
+    return plan, pd.DataFrame(skipped, columns=['folder', 'target', 'reason'])
+
+
+def _read_journal(journal_path):
+    with open(journal_path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+    return header['root'], [tuple(pair) for pair in header['plan']]
+
+
+def recover_renames(root, direction='forward', journal_path=None):
+    """
+    Finish or undo the renames of an interrupted bulk_rename from its journal.
+    A rename is atomic, so every planned folder is either under its old or its
+    new name.
+
+    Args:
+        root (str): the renamed folder
+        direction (str, optional): 'forward' to finish the plan, 'back' to
+            restore the old names
+        journal_path (str, optional): path of the journal, next to root by default
+
+    Returns:
+        count (int): number of folders renamed by the recovery
+    """
+    if direction not in ('forward', 'back'):
+        raise ValueError(f"direction must be 'forward' or 'back', not {direction!r}")
+    journal_path = journal_path or journal_path_of(root)
+    if not os.path.exists(journal_path):
+        return 0
+    _, plan = _read_journal(journal_path)
+    count = 0
+    for old, new in plan:
+        source, target = (old, new) if direction == 'forward' else (new, old)
+        if os.path.exists(f'{root}/{source}') and not os.path.exists(f'{root}/{target}'):
+            os.rename(f'{root}/{source}', f'{root}/{target}')
+            count += 1
+    os.remove(journal_path)
+    print(f"Rolled {direction} {count} renames of {root}")
+    return count
+
+
+def bulk_rename(root, plan, workers=1, journal_path=None):
+    """
+    Rename the folders of root following a plan of plan_renames. The plan is
+    written to a journal before the first rename and every finished rename is
+    appended to it; the journal is removed when all the renames are done. After
+    a crash, recover_renames rolls the plan forward or back.
+
+    Args:
+        root (str): the folder of the folders to rename
+        plan (list): (old, new) pairs of plan_renames
+        workers (int, optional): number of rename threads, 1 renames in order.
+            The renames of one folder lock it on a local disk, threads only
+            help on network file systems
+        journal_path (str, optional): path of the journal, next to root by default
+
+    Returns:
+        done (list): the (old, new) pairs renamed
+    """
+    journal_path = journal_path or journal_path_of(root)
+    if os.path.exists(journal_path):
+        raise RuntimeError(f"{journal_path} is left by an interrupted rename, "
+                           f"run recover_renames({root!r}, 'forward' or 'back') first")
+    if not plan:
+        return []
+    lock = threading.Lock()
+    done = []
+    with open(journal_path, 'w', encoding='utf-8') as journal:
+        journal.write(json.dumps({'root': root, 'plan': plan}, ensure_ascii=False) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+        def rename(pair):
+            os.rename(f'{root}/{pair[0]}', f'{root}/{pair[1]}')
+            with lock:
+                journal.write(json.dumps({'done': pair}, ensure_ascii=False) + '\n')
+                done.append(pair)
+
+        if workers > 1:
+            with ThreadPoolExecutor(workers) as pool:
+                # result() raises the first failed rename, the journal stays
+                for future in [pool.submit(rename, pair) for pair in plan]:
+                    future.result()
+        else:
+            for pair in plan:
+                rename(pair)
+    os.remove(journal_path)
+    return done
@@ -3,66 +3,109 @@ from time import time
 import shutil
 import numpy as np
 import pandas as pd
+from image_inventory import ImageInventory
+from bulk_rename import plan_renames, bulk_rename
+from file_links import materialize, write_manifest
+from image_store import ImageStore, store_path_of
+from image_hashes import find_duplicate_images
+from image_validation import validate_images
+from people_filters import delete_people, number_of_images_in, duplicate_names, missing_before_year
 
 
-def read_data(path):
+def read_data(path, chunksize=None):
     """
-    Read json file in dataframe
+    Read json or json lines (.jsonl) file in dataframe
 
     Args:
         path (str): Path to dataset
+        chunksize (int, optional): for json lines, stream the file in
+            dataframes of chunksize records
 
     Returns:
-        df (Pandas DataFrame) : dataframe of dataset
+        df (Pandas DataFrame) : dataframe of dataset (iterator of dataframes with chunksize)
     """
+    if path.endswith('.jsonl'):
+        return pd.read_json(path, lines=True, chunksize=chunksize)
     df = pd.read_json(path)
     return df
 
 
-def copy_images(from_path, to_path):
+def copy_images(from_path, to_path, mode='copy', store_path=None):
     """
     Create a new copy of dataset to modify
 
     Args:
         from_path (str): path of original dataset
         to_path (str): new destination
+        mode (str, optional): 'copy' copies the whole folder. 'hardlink' and
+            'symlink' add the images to the content-addressed store of
+            from_path (copies, never links to from_path) and build to_path as
+            links to its blobs: only delete and rename in such a copy, a file
+            written in place changes the store. The manifest.json files of the
+            scraper are not in the links
+        store_path (str, optional): path of the image store, next to from_path by default
     """
-    if os.path.isdir(from_path):
+    if not os.path.isdir(from_path):
+        return
+    if mode == 'copy':
         shutil.copytree(from_path, to_path)
+        return
+    store = ImageStore(store_path or store_path_of(from_path))
+    snapshot = store.add_tree(from_path, os.path.normpath(to_path).replace(os.sep, '_'))
+    store.checkout(snapshot, to_path, mode)
 
 
-def delete_people_with_number_of_images(df, num, path):
+def delete_people_with_number_of_images(df, num, path, dry_run=False):
     """
     Delete images of people with number_of_images = num
     Drope  people with number_of_images = num from dataframe
 
     Args:
         df (pandas DataFrame): Information of people
-        num (int): drop person with this number_of_images
+        num (int or list): drop person with this number_of_images (or these numbers)
         path (str): path to images
+        dry_run (bool, optional): only report the people to delete
+
+    Returns:
+        plan (pandas DataFrame): the people deleted, see people_filters.plan_deletions
     """
-    t0 = time()
-    folders_num_img = df.id[df.number_of_images == num]
-    df.drop(df[df.number_of_images == num].index, inplace=True)
-    for i in folders_num_img:
-        shutil.rmtree(f'{path}/{i}')
-    t1 = time() - t0
-    print(f"Delete people with nummber of images = {num} in {t1}")
+    counts = num if isinstance(num, (list, tuple, range)) else [num]
+    return delete_people(df, [number_of_images_in(counts)], path, folder='id', dry_run=dry_run)
 
 
-def drop_duplicates(df, path):
+def drop_duplicates(df, path, perceptual=False):
     """
     Drop duplicates based on person name and images
 
     Args:
         df (pandas DataFrame): Information of people
         path (str): path to dataset
+        perceptual (bool, optional): find the duplicated images of a person by
+            their perceptual hashes (resized and re-encoded copies), not by the
+            id at the end of their file name
     """
     duplicates = df['name_arabic'][df['name_arabic'].duplicated()]
     df.drop(df[df['name_arabic'].duplicated()].index, inplace=True)
-    for i in duplicates:
+    drop_duplicate_images(duplicates, path, perceptual)
+
+
+def drop_duplicate_images(names, path, perceptual=False):
+    """
+    Delete the duplicated images in the folders of people recorded more than once
+
+    Args:
+        names (iterable): the folder names of the people recorded more than once
+        path (str): path to dataset
+        perceptual (bool, optional): see drop_duplicates
+    """
+    if perceptual:
+        clusters = find_duplicate_images(path, within_person=True)
+        delete_duplicate_images(path, clusters[clusters['person'].isin(set(names))])
+        return
+    inventory = ImageInventory(path).refresh()
+    for i in names:
         duplicates_id = []
-        img_dir = os.listdir(f'{path}/{i}')
+        img_dir = inventory.files(i)
         for j in img_dir:
             id_ = j.split('_')[-1]
             if id_ in duplicates_id:
@@ -71,7 +114,54 @@ def drop_duplicates(df, path):
                 duplicates_id.append(id_)
 
 
-def delete_people_missing_before_year(df, year, path):
+def delete_duplicate_images(path, clusters, dry_run=False):
+    """
+    Delete the copies of the near-duplicate images of each person, the image
+    kept is the largest of its cluster
+
+    Args:
+        path (str): path to images
+        clusters (pandas DataFrame): clusters of image_hashes.image_clusters
+        dry_run (bool, optional): only report the images to delete
+
+    Returns:
+        copies (pandas DataFrame): the images deleted
+    """
+    t0 = time()
+    copies = clusters[~clusters['keep']]
+    if not dry_run:
+        for person, file_name in zip(copies['person'], copies['file']):
+            os.remove(f'{path}/{person}/{file_name}')
+    t1 = time() - t0
+    print(f"{'Would delete' if dry_run else 'Delete'} {len(copies)} duplicated images in {t1}")
+    return copies
+
+
+def delete_invalid_images(path, dry_run=False):
+    """
+    Delete the images that can't be read: HTML error pages and truncated downloads
+
+    Args:
+        path (str): path to images
+        dry_run (bool, optional): only report the images to delete
+
+    Returns:
+        invalid (pandas DataFrame): the images deleted, see image_validation.validate_images
+    """
+    t0 = time()
+    images = validate_images(path)
+    invalid = images[~images['ok']]
+    for reason, count in invalid['error'].value_counts().items():
+        print(f"{'Would delete' if dry_run else 'Delete'} {count} images: {reason}")
+    if not dry_run:
+        for file_path in invalid['path']:
+            os.remove(file_path)
+    t1 = time() - t0
+    print(f"{'Would delete' if dry_run else 'Delete'} {len(invalid)} invalid images in {t1}")
+    return invalid
+
+
+def delete_people_missing_before_year(df, year, path, dry_run=False):
     """
     Delete missing people before specific year and delete their images
 
@@ -79,16 +169,12 @@ def delete_people_missing_before_year(df, year, path):
         df (pandas DataFrame): Information of people
         year (int): year to delete people before
         path (str): path to dataset
-    """
-    t0 = time()
-    data_before_year = df['name_arabic'][df['year'] <= year]
-    df.drop(df[df['year'] <= year].index, inplace=True)
-    for i in data_before_year:
-        if i in os.listdir(f'{path}'):
-            shutil.rmtree(f'{path}/{i}')
+        dry_run (bool, optional): only report the people to delete
 
-    t1 = time() - t0
-    print(f"Delete people missing from year = {year} in {t1}")
+    Returns:
+        plan (pandas DataFrame): the people deleted, see people_filters.plan_deletions
+    """
+    return delete_people(df, [missing_before_year(year)], path, dry_run=dry_run)
 
 
 def reset_id():
@@ -117,27 +203,38 @@ def export_json(df, path='Data/missing_people_final.json'):
     print(f"Save new json file {t1}")
 
 
-def rename_dir(image_path, json_path):
+def rename_dir(image_path, json_path, workers=1):
     """
     Rename image directory from names in arabic to their id
 
     Args:
         image_path (str): path to images
         json_path (str): path to json file
+        workers (int, optional): number of rename threads (see bulk_rename)
+
+    Returns:
+        skipped (pandas DataFrame): the directories left with their name and why
     """
     t0 = time()
-    dir_ = os.listdir(image_path)
+    inventory = ImageInventory(image_path).refresh()
     df = pd.read_json(json_path)
-    df.set_index('id', inplace=True)
-    for i in dir_:
-        os.rename(f'{image_path}/{i}',
-                  f"{image_path}/{str(df[df['name_arabic']==i].index[0])}")
+    # id of the first person with each name, instead of a scan of the column per folder
+    first = df.drop_duplicates('name_arabic')
+    ids = dict(zip(first['name_arabic'], first['id']))
+    plan, skipped = plan_renames(inventory.folders(), ids)
+    for reason, count in skipped['reason'].value_counts().items():
+        print(f"Skip {count} directories: {reason}")
+    done = bulk_rename(image_path, plan, workers)
+    for old, new in done:
+        inventory.rename(old, new)
+    inventory.save()
 
     t1 = time() - t0
-    print(f"Rename directories to id of people in {t1}")
+    print(f"Rename {len(done)} directories to id of people in {t1} ({len(done) / max(t1, 1e-9):.0f} per second)")
+    return skipped
 
 
-def train_test_split(rootDir, dataDir, test_ratio=None, one_shot=False, include=False, json_path=None, from_path=None, to_path=None, img_per_person_to_remove=None, save_path=None):
+def train_test_split(rootDir, dataDir, test_ratio=None, one_shot=False, include=False, json_path=None, from_path=None, to_path=None, img_per_person_to_remove=None, save_path=None, mode='copy', workers=8, valid_only=True):
     """
     Split images into train and test set
 
@@ -152,40 +249,56 @@ def train_test_split(rootDir, dataDir, test_ratio=None, one_shot=False, include=
         to_path (str, optional): destination for data copy
         img_per_person_to_remove (str, optional): drop people with certain number of images
         save_path (str, optional): path of new json file
+        mode (str, optional): how the images are put in train and test: 'copy',
+            'hardlink', 'symlink', 'reflink' (copy-on-write clone, a copy where
+            the file system can't) or 'manifest' (no folders, only the
+            train.jsonl and test.jsonl written in every mode)
+        workers (int, optional): number of copy threads for 'copy' and 'reflink'
+        valid_only (bool, optional): leave out the images that can't be read,
+            from the validation index of dataDir
     """
     t0 = time()
     if not include:
 
         df = read_data(json_path)
         copy_images(from_path, to_path)
-        for i in range(1, img_per_person_to_remove+1):
-            delete_people_with_number_of_images(df, i, to_path)
+        delete_people_with_number_of_images(df, range(1, img_per_person_to_remove+1), to_path)
         export_json(df, path=save_path)
 
-    classes = os.listdir(dataDir)
+    inventory = ImageInventory(dataDir).refresh()
+    classes = inventory.folders()
+    if valid_only:
+        images = validate_images(dataDir)
+        invalid = set(zip(images['person'][~images['ok']], images['file'][~images['ok']]))
+    pairs = []
+    manifests = {'train': [], 'test': []}
+    os.makedirs(rootDir, exist_ok=True)
     for i in classes:
-        os.makedirs(rootDir + '/train/' + i)
-        os.makedirs(rootDir + '/test/' + i)
-
         source = dataDir + '/' + i
-        allFileNames = os.listdir(source)
+        allFileNames = inventory.files(i)
+        if valid_only:
+            allFileNames = [name for name in allFileNames if (i, name) not in invalid]
         np.random.shuffle(allFileNames)
 
         train_FileNames, test_FileNames = np.split(np.array(allFileNames),
                                                    [int(len(allFileNames) * (1 - test_ratio)) if not one_shot else one_shot])
 
-        train_FileNames = [source+'/' +
-                           name for name in train_FileNames.tolist()]
-        test_FileNames = [source+'/' +
-                          name for name in test_FileNames.tolist()]
-
-        for name in train_FileNames:
-            shutil.copy(name, rootDir + '/train/' + i)
-
-        for name in test_FileNames:
-            shutil.copy(name, rootDir + '/test/' + i)
-    print(f'training folder: {rootDir}"/train/"')
-    print(f'testing folder: {rootDir}"/test/"')
+        for split, names in (('train', train_FileNames), ('test', test_FileNames)):
+            if mode != 'manifest':
+                os.makedirs(rootDir + f'/{split}/' + i)
+            for name in names.tolist():
+                pairs.append((source + '/' + name, rootDir + f'/{split}/' + i + '/' + name))
+                manifests[split].append({'label': i, 'path': source + '/' + name})
+
+    modes = materialize(pairs, mode, workers)
+    for split, records in manifests.items():
+        write_manifest(f'{rootDir}/{split}.jsonl', records)
+    if mode != 'manifest':
+        print(f'training folder: {rootDir}"/train/"')
+        print(f'testing folder: {rootDir}"/test/"')
+    print(f'manifests: {rootDir}/train.jsonl, {rootDir}/test.jsonl')
+    if modes.get('copy') and mode in ('hardlink', 'reflink'):
+        print(f"{modes['copy']} images copied, {mode} is not supported for them")
     t1 = time() - t0
     way = f'{one_shot} shots' if one_shot else f'{test_ratio} test ratio'
     print(f"Split images with {way} in {t1}")
@@ -201,15 +314,15 @@ if __name__ == "__main__":
         df = read_data(json_path)
 
         img_path = to_path
-        copy_images(from_path, to_path)
+        # only deletions and renames below: a working set of hardlinks to the image store
+        copy_images(from_path, to_path, mode='hardlink')
+        delete_invalid_images(img_path)
 
         img_per_person_to_remove = 0
-        delete_people_with_number_of_images(
-            df, img_per_person_to_remove, img_path)
-
-        drop_duplicates(df, img_path)
-
-        delete_people_missing_before_year(df, 2010, img_path)
+        # in the order of the old steps: a duplicate of a person without images is kept
+        plan = delete_people(df, [number_of_images_in([img_per_person_to_remove]), duplicate_names(),
+                                  missing_before_year(2010)], img_path)
+        drop_duplicate_images(plan['folder'][plan['reason'] == 'duplicate name_arabic'].unique(), img_path)
         reset_id()
         export_json(df)
 
@@ -0,0 +1,223 @@
+import os
+import json
+from time import time
+
+import pandas as pd
+
+from arabic_content import GOVS_MAPPING_V2, EGYPT_GOVS_V2
+from arabic_normalize import normalize
+from date_parsing import parse_dates, parse_ages, arabic_dates
+from record_sink import JsonlSink, compact_jsonl
+from image_inventory import ImageInventory, join_inventory
+
+# the image columns keep their camel case
+KEEP_CASE = ('imageRef', 'imageRefExtra')
+
+# government stem of the scraper -> full government name, like the
+# "fix names of govs" cell of clean_json.ipynb but on the normalized names
+GOV_NAMES = {stem: gov for stem in GOVS_MAPPING_V2 for gov in EGYPT_GOVS_V2 if normalize(stem) in normalize(gov)}
+
+
+def lowercase_columns(df, report):
+    """
+    Lower case the column names, except the image columns
+    """
+    return df.rename(columns=lambda name: name if name in KEEP_CASE else name.lower())
+
+
+def extract_dates_and_ages(df, report):
+    """
+    Parse missing_date and current_age: keep the date text without its label,
+    add missing_date_ar (arabic digits) and missing_date_en (datetime), and
+    report the rows that can't be parsed
+    """
+    df = df.copy()
+    texts = df['missing_date'].astype('string')
+    df['missing_date'] = texts.str.replace(r'^\D+', '', regex=True)
+    df['missing_date_ar'] = arabic_dates(texts)
+    df['missing_date_en'], date_report = parse_dates(texts)
+    df['current_age'], age_report = parse_ages(df['current_age'])
+    for issues in (date_report, age_report):
+        if len(issues):
+            report.append(issues.assign(id=df.loc[issues.index, 'id']))
+    return df
+
+
+def fix_governments(df, report):
+    """
+    Replace the government stems found by the scraper by the full government names
+    """
+    df = df.copy()
+    df['government_arabic'] = df['government_arabic'].map(GOV_NAMES).fillna(df['government_arabic'])
+    return df
+
+
+def split_date(df, report):
+    """
+    Split missing_date_en into day, month and year columns
+    """
+    df = df.copy()
+    df['day'] = df['missing_date_en'].dt.day
+    df['month'] = df['missing_date_en'].dt.month
+    df['year'] = df['missing_date_en'].dt.year
+    return df
+
+
+def count_images(images_path):
+    """
+    Step joining the number of images of every person in images_path/<name_arabic>
+    from the image inventory, refreshed once when the step is built
+
+    Args:
+        images_path (str): the folder of the person image folders
+
+    Returns:
+        step (callable): the number_of_images step
+    """
+    inventory = ImageInventory(images_path).refresh().to_frame()
+
+    def number_of_images(df, report):
+        return join_inventory(df, inventory)
+    return number_of_images
+
+
+def drop_columns(*columns):
+    """
+    Step dropping the columns (missing columns are ignored)
+    """
+    def drop(df, report):
+        return df.drop(columns=list(columns), errors='ignore')
+    return drop
+
+
+DEFAULT_STEPS = [lowercase_columns, extract_dates_and_ages, fix_governments, split_date, drop_columns('url', 'image')]
+
+
+def clean_chunk(df, steps=DEFAULT_STEPS, report=None):
+    """
+    Apply the cleaning steps to one chunk of records
+
+    Args:
+        df (pandas DataFrame): the records
+        steps (list, optional): callables step(df, report) -> df, applied in order
+        report (list, optional): the steps append the DataFrames of the rows
+            they couldn't clean to it
+
+    Returns:
+        df (pandas DataFrame): the cleaned records
+    """
+    if report is None:
+        report = []
+    for step in steps:
+        df = step(df, report)
+    return df
+
+
+def iter_chunks(path, chunksize=1000, offset=0):
+    """
+    Read the records of a JSON Lines file in chunks, from a byte offset
+
+    Args:
+        path (str): path of the .jsonl file
+        chunksize (int, optional): number of records per chunk
+        offset (int, optional): byte offset to start from (the end of the
+            last line read by a previous run)
+
+    Yields:
+        chunk (tuple): (DataFrame of the records, byte offset after the chunk)
+    """
+    records = []
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        for line in iter(file.readline, b''):
+            if not line.endswith(b'\n'):
+                # a record being appended, it is read by the next run
+                break
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Skip broken line ending at byte {offset} of {path}")
+                continue
+            if len(records) == chunksize:
+                yield pd.DataFrame(records), offset
+                records = []
+    if records:
+        yield pd.DataFrame(records), offset
+
+
+def _load_state(state_path):
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'offset': 0, 'output_size': 0, 'report_size': 0}
+
+
+def _save_state(state_path, state):
+    with open(state_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(state_path + '.tmp', state_path)
+
+
+def clean_stream(input_path, output_path, steps=DEFAULT_STEPS, chunksize=1000, resume=True):
+    """
+    Clean a JSON Lines file of the scraper chunk by chunk into a JSON Lines
+    output, so the memory only holds one chunk. The byte offset of the input
+    is saved in output_path.state.json after every chunk: the next run only
+    cleans the records appended by a new crawl. A person scraped again is
+    appended again to the input: its last record replaces the previous ones
+    in the output, like export_json. The unparseable rows are appended to
+    output_path.report.jsonl.
+
+    Args:
+        input_path (str): the missing_people.jsonl of the scraper
+        output_path (str): the cleaned .jsonl file
+        steps (list, optional): the cleaning steps, see clean_chunk
+        chunksize (int, optional): number of records per chunk
+        resume (bool, optional): continue from the saved offset, False cleans
+            the whole input again into a new output
+
+    Returns:
+        count (int): number of records cleaned by this run
+    """
+    t0 = time()
+    state_path = output_path + '.state.json'
+    report_path = output_path + '.report.jsonl'
+    state = _load_state(state_path) if resume else {'offset': 0, 'output_size': 0, 'report_size': 0}
+    # drop what a crashed run wrote after its last saved chunk
+    for path, size in ((output_path, state['output_size']), (report_path, state['report_size'])):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    count = 0
+    with JsonlSink(output_path) as sink, JsonlSink(report_path) as report_sink:
+        for chunk, offset in iter_chunks(input_path, chunksize, state['offset']):
+            report = []
+            cleaned = clean_chunk(chunk, steps, report)
+            sink.write(json.loads(cleaned.to_json(orient='records', date_format='iso', force_ascii=False)))
+            for issues in report:
+                report_sink.write(json.loads(issues.to_json(orient='records', force_ascii=False)))
+            sink.flush()
+            report_sink.flush()
+            count += len(cleaned)
+            _save_state(state_path, {'offset': offset, 'output_size': os.path.getsize(output_path),
+                                     'report_size': os.path.getsize(report_path)})
+            print(f"Cleaned {count} records .....")
+    if count:
+        replaced = compact_jsonl(output_path)
+        if replaced:
+            _save_state(state_path, {**_load_state(state_path), 'output_size': os.path.getsize(output_path)})
+            print(f"Replaced {replaced} records by their new version")
+    print(f"\n==>{count} records cleaned in {time() - t0:.1f}s into: {output_path}")
+    return count
+
+
+if __name__ == '__main__':
+    # You may need to change the paths to your data directory
+    DATA_DIR = '../Scrapping/data_not_ready'
+    steps = DEFAULT_STEPS + [count_images(f'{DATA_DIR}/images')]
+    clean_stream(f'{DATA_DIR}/missing_people.jsonl', f'{DATA_DIR}/missing_people_clean.jsonl', steps)
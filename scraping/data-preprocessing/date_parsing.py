@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# arabic-indic and extended (persian) digits to ascii digits, and the direction
+# marks written around the date parts deleted
+DIGITS_TABLE = str.maketrans({**{chr(0x0660 + i): str(i) for i in range(10)},
+                              **{chr(0x06F0 + i): str(i) for i in range(10)},
+                              '\u200f': None, '\u200e': None, '\u061c': None})
+
+# the website writes dd/mm/yyyy
+DATE_PATTERN = r'(?P<day>\d{1,2})\D{1,3}(?P<month>\d{1,2})\D{1,3}(?P<year>\d{4})'
+AGE_PATTERN = r'(\d{1,3})'
+
+# the website shows 01/01/1970 when the missing date is unknown
+SENTINEL_DATES = ('1970-01-01',)
+
+
+def to_ascii_digits(texts):
+    """
+    Map the arabic-indic digits of a column to ascii and strip the direction marks
+
+    Args:
+        texts (pandas Series): the texts
+
+    Returns:
+        texts (pandas Series): the cleaned texts
+    """
+    return texts.astype('string').str.translate(DIGITS_TABLE)
+
+
+def digits_to_int(texts):
+    """
+    Convert a column of digit strings (ascii or arabic-indic) to Int64: the
+    distinct values are few (days, months, years, ages), so every one of them
+    is converted once and the column is taken from them
+
+    Args:
+        texts (pandas Series): the digit strings, missing values allowed
+
+    Returns:
+        numbers (pandas Series): the numbers (Int64)
+    """
+    codes, uniques = pd.factorize(texts)
+    # int() reads every unicode decimal digit
+    values = np.array([int(value) for value in uniques] + [0], dtype='int64')
+    return pd.Series(pd.arrays.IntegerArray(values[codes], codes == -1), index=texts.index)
+
+
+def _report(column, texts, reasons):
+    bad = reasons.notna()
+    return pd.DataFrame({'column': column, 'value': texts[bad], 'reason': reasons[bad]},
+                        columns=['column', 'value', 'reason'])
+
+
+def parse_dates(texts, sentinels=SENTINEL_DATES):
+    """
+    Parse the missing dates of a column, e.g. "تاريخ الفقد : ٢٠‏/٠٩‏/٢٠١١", day first
+
+    Args:
+        texts (pandas Series): the date texts, with or without their label
+        sentinels (tuple, optional): dates the website uses for unknown dates,
+            they are reported instead of parsed
+
+    Returns:
+        dates (pandas Series): the dates, NaT for the reported rows
+        report (pandas DataFrame): column, value and reason of every unparseable row
+    """
+    # \d matches the arabic-indic digits too, and the direction marks are non digits
+    parts = texts.astype('string').str.extract(DATE_PATTERN)
+    dates = pd.to_datetime(parts.apply(digits_to_int).astype('float64'), errors='coerce')
+    reasons = pd.Series(None, index=texts.index, dtype=object)
+    reasons[dates.isna()] = 'invalid date'
+    reasons[parts['year'].isna()] = 'no date'
+    sentinel = dates.isin(pd.to_datetime(list(sentinels)))
+    reasons[sentinel] = 'sentinel date'
+    dates[sentinel] = pd.NaT
+    return dates, _report('missing_date', texts, reasons)
+
+
+def arabic_dates(texts):
+    """
+    Rewrite the dates of a column as day-month-year in arabic-indic digits
+    (the missing_date_ar column), empty if there is no date
+
+    Args:
+        texts (pandas Series): the date texts
+
+    Returns:
+        dates (pandas Series): the arabic dates
+    """
+    parts = texts.astype('string').str.extract(DATE_PATTERN)
+    return (parts['day'] + '-' + parts['month'] + '-' + parts['year']).fillna('')
+
+
+def parse_ages(texts):
+    """
+    Parse the current ages of a column, e.g. "العمر الحالي (تقريبا) : ١٢"
+
+    Args:
+        texts (pandas Series): the age texts, with or without their label
+
+    Returns:
+        ages (pandas Series): the ages (Int64), missing for the reported rows
+        report (pandas DataFrame): column, value and reason of every unparseable row
+    """
+    ages = digits_to_int(texts.astype('string').str.extract(AGE_PATTERN, expand=False))
+    reasons = pd.Series(None, index=texts.index, dtype=object)
+    reasons[ages.isna()] = 'no age'
+    return ages, _report('current_age', texts, reasons)
@@ -0,0 +1,183 @@
+import os
+import json
+from time import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from image_hashes import list_images
+
+INDEX = 'index.json'
+INDEX_COLUMNS = ['path', 'label', 'shard', 'row', 'mtime', 'size']
+
+
+def center_square(image):
+    """
+    Detector of the centered square of the image, the default crop of the
+    portraits; a face detector returns the (left, top, right, bottom) box of
+    the face the same way, or None to leave out an image without a face
+    """
+    width, height = image.size
+    side = min(width, height)
+    left, top = (width - side) // 2, (height - side) // 2
+    return left, top, left + side, top + side
+
+
+def load_face(path, size=(160, 160), detector=None):
+    """
+    Decode, crop and resize an image, run in the worker processes
+
+    Args:
+        path (str): path of the image
+        size (tuple, optional): (width, height) of the array
+        detector (callable, optional): detector(PIL image) -> box or None, a
+            module level function or a picklable object for the processes
+
+    Returns:
+        face (numpy array): (height, width, 3) uint8, None if the image can't
+            be decoded or has no face
+    """
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(path) as image:
+            image.draft('RGB', (size[0] * 2, size[1] * 2))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    if detector is not None:
+        box = detector(image)
+        if box is None:
+            return None
+        image = image.crop(box)
+    return np.asarray(image.resize(size, Image.BILINEAR), dtype=np.uint8)
+
+
+def _read_index(out_path):
+    try:
+        with open(f'{out_path}/{INDEX}', encoding='utf-8') as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return None, pd.DataFrame(columns=INDEX_COLUMNS)
+    return saved['config'], pd.DataFrame(saved['images'], columns=INDEX_COLUMNS)
+
+
+def _write_index(out_path, config, index):
+    path = f'{out_path}/{INDEX}'
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'config': config, 'images': index[INDEX_COLUMNS].to_dict('records')}, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def _list_source(source):
+    # a folder of person folders or a split manifest (train.jsonl) of train_test_split
+    if source.endswith('.jsonl'):
+        images = pd.read_json(source, lines=True, dtype={'label': str})
+    else:
+        images = list_images(source).rename(columns={'person': 'label'})
+    stats = [os.stat(path) for path in images['path']]
+    return images.assign(mtime=[stat.st_mtime_ns for stat in stats], size=[stat.st_size for stat in stats])
+
+
+def build_shards(source, out_path, size=(160, 160), detector=None, shard_size=4096, workers=None):
+    """
+    Decode the images once into memory-mapped shards of fixed-shape uint8
+    arrays (out_path/shard_00000.npy, ...) with an index of the path, label,
+    shard and row of every image. A re-run only decodes the images added or
+    modified since the last one (same path, mtime and size are kept) and
+    writes them to new shards; a new size or detector rebuilds everything.
+
+    Args:
+        source (str): the folder of the person image folders (the label is
+            the folder name, the id after rename_dir) or a train.jsonl /
+            test.jsonl manifest of train_test_split
+        out_path (str): folder of the shards
+        size (tuple, optional): (width, height) of the arrays
+        detector (callable, optional): the crop, see load_face
+        shard_size (int, optional): number of images per shard
+        workers (int, optional): number of decoding processes, the number of CPUs by default
+
+    Returns:
+        index (pandas DataFrame): the index of the images in the shards, shard
+            and row are -1 for the images that can't be decoded
+    """
+    t0 = time()
+    os.makedirs(out_path, exist_ok=True)
+    config = {'size': list(size), 'detector': None if detector is None else getattr(detector, '__name__', repr(detector))}
+    saved_config, index = _read_index(out_path)
+    if saved_config != config:
+        index = index.iloc[0:0]
+    images = _list_source(source)
+    merged = images.merge(index[['path', 'mtime', 'size', 'shard', 'row']].astype({'mtime': 'int64', 'size': 'int64'}),
+                          on=['path', 'mtime', 'size'], how='left')
+    kept = merged[merged['shard'].notna()]
+    todo = merged[merged['shard'].isna()].reset_index(drop=True)
+
+    next_shard = int(index['shard'].max()) + 1 if len(index) else 0
+    rows = []
+    shard = None
+    with ProcessPoolExecutor(workers) as pool:
+        faces = pool.map(partial(load_face, size=size, detector=detector), todo['path'], chunksize=32)
+        for k, face in enumerate(faces):
+            if face is None:
+                continue
+            if shard is None or row == len(shard):
+                if shard is not None:
+                    shard.flush()
+                remaining = len(todo) - k
+                shard = np.lib.format.open_memmap(f'{out_path}/shard_{next_shard:05d}.npy', mode='w+', dtype=np.uint8,
+                                                  shape=(min(shard_size, remaining), size[1], size[0], 3))
+                shard_number, next_shard, row = next_shard, next_shard + 1, 0
+            shard[row] = face
+            rows.append((k, shard_number, row))
+            row += 1
+    if shard is not None:
+        shard.flush()
+
+    # the images that can't be decoded are kept with shard -1, not to decode them again
+    done = todo.assign(shard=-1, row=-1)
+    done.loc[[k for k, _, _ in rows], 'shard'] = [s for _, s, _ in rows]
+    done.loc[[k for k, _, _ in rows], 'row'] = [r for _, _, r in rows]
+    index = pd.concat([kept, done], ignore_index=True).astype({'shard': int, 'row': int})
+    _write_index(out_path, config, index)
+    # the shards of no image are left by deleted or modified images
+    used = {f'shard_{shard:05d}.npy' for shard in index['shard'].unique() if shard >= 0}
+    for name in os.listdir(out_path):
+        if name.startswith('shard_') and name not in used:
+            os.remove(f'{out_path}/{name}')
+    t1 = time() - t0
+    print(f"Shards of {(index['shard'] >= 0).sum()} images ({len(rows)} decoded, {len(todo) - len(rows)} failed) in {t1}")
+    return index
+
+
+class FaceShards:
+    """
+    Read only view of the shards of build_shards: the arrays are memory-mapped,
+    reading an image copies nothing until it is used
+
+    Args:
+        out_path (str): folder of the shards
+    """
+
+    def __init__(self, out_path):
+        self.out_path = out_path
+        self.config, index = _read_index(out_path)
+        self.index = index[index['shard'] >= 0].reset_index(drop=True)
+        self.labels = self.index['label'].to_numpy()
+        self._shards = {}
+
+    def shard(self, number):
+        if number not in self._shards:
+            self._shards[number] = np.load(f'{self.out_path}/shard_{number:05d}.npy', mmap_mode='r')
+        return self._shards[number]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, k):
+        """
+        (array, label) of the k-th image of the index
+        """
+        entry = self.index.iloc[k]
+        return self.shard(int(entry['shard']))[int(entry['row'])], entry['label']
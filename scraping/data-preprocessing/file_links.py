@@ -0,0 +1,102 @@
+import os
+import json
+import errno
+import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+# ways to put an image in a split or a view: a copy of the bytes, a link to
+# them, a copy-on-write clone (reflink) or nothing but a manifest line
+MODES = ('copy', 'hardlink', 'symlink', 'reflink', 'manifest')
+# _IOW(0x94, 9, int) of linux/fs.h: clone a whole file on btrfs, xfs, ...
+FICLONE = 0x40049409
+
+
+def reflink(src, dst):
+    """
+    Clone src to dst sharing its blocks until one of them is modified
+
+    Raises:
+        OSError: the file system (or the platform) can't clone files
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflink is not supported on this platform', src)
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dst)
+            raise
+    shutil.copymode(src, dst)
+
+
+def link_file(src, dst, mode='copy'):
+    """
+    Put the file src at dst with one of the MODES. A hardlink across file
+    systems and a reflink where it isn't supported fall back to a copy.
+
+    Args:
+        src (str): path of the file
+        dst (str): new path, its folder must exist
+        mode (str, optional): 'copy', 'hardlink', 'symlink' or 'reflink'
+
+    Returns:
+        mode (str): the mode used
+    """
+    if mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            return mode
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+    elif mode == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+        return mode
+    elif mode == 'reflink':
+        try:
+            reflink(src, dst)
+            return mode
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+                raise
+    elif mode != 'copy':
+        raise ValueError(f"mode must be one of {MODES[:-1]}, not {mode!r}")
+    shutil.copy(src, dst)
+    return 'copy'
+
+
+def materialize(pairs, mode='copy', workers=8):
+    """
+    Put every (src, dst) file pair in place. The copies and the clones run in
+    a thread pool, the links are only metadata and are made in order.
+
+    Args:
+        pairs (list): (src, dst) paths, the folders of dst must exist
+        mode (str, optional): see link_file, 'manifest' does nothing
+        workers (int, optional): number of copy threads
+
+    Returns:
+        modes (Counter): number of files per mode used, to see the fallbacks
+    """
+    if mode == 'manifest':
+        return Counter()
+    if mode in ('copy', 'reflink') and workers > 1 and len(pairs) > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            return Counter(pool.map(lambda pair: link_file(*pair, mode), pairs))
+    return Counter(link_file(src, dst, mode) for src, dst in pairs)
+
+
+def write_manifest(path, records):
+    """
+    Write records (dicts) to a JSON Lines manifest, one per line
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
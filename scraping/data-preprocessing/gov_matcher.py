@@ -0,0 +1,134 @@
+from collections import deque
+
+from arabic_content import GOVS_MAPPING_V2, EGYPT_GOVS
+from arabic_normalize import normalize
+
+
+class GovMatcher:
+    """
+    Aho-Corasick automaton over a set of government names: one pass over the
+    text finds every mention, whatever the number of names.
+
+    Args:
+        mapping (dict or list): name -> value (e.g. the english name), a list
+            maps every name to itself
+        default (tuple, optional): (name, value) returned by find when the
+            text has no government
+        normalizer (callable, optional): applied to the names and the texts
+            before matching (e.g. arabic_normalize.normalize), the matches
+            still report the names as given
+    """
+
+    def __init__(self, mapping, default=None, normalizer=None):
+        if not isinstance(mapping, dict):
+            mapping = {name: name for name in mapping}
+        self.mapping = dict(mapping)
+        self.default = default
+        self.normalizer = normalizer
+        # the searched pattern of every name, the first name wins when two
+        # names have the same normalized form
+        self._names = {}
+        for name in self.mapping:
+            self._names.setdefault(normalizer(name) if normalizer else name, name)
+        # state 0 is the root, every state has its transitions and the names
+        # ending at it, including the ones of its fail state
+        self._goto = [{}]
+        self._out = [[]]
+        for pattern in self._names:
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(pattern)
+        fail = [0] * len(self._goto)
+        order = []
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = self._goto[fallback].get(char, 0) if state else 0
+                self._out[next_state] = self._out[next_state] + self._out[fail[next_state]]
+        # follow the fail links once here instead of on every character: each
+        # state gets the transitions of its fail state it doesn't override
+        for state in order:
+            self._goto[state] = {**self._goto[fail[state]], **self._goto[state]}
+
+    def find_all(self, text):
+        """
+        Find every government mention in the text, overlapping ones included
+
+        Args:
+            text (str): the text to search
+
+        Returns:
+            matches (list): (start, length, name, value) tuples ordered by
+                their end, start and length are in the normalized text
+        """
+        if self.normalizer is not None:
+            text = self.normalizer(text)
+        goto, out = self._goto, self._out
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for pattern in out[state]:
+                    name = self._names[pattern]
+                    matches.append((i + 1 - len(pattern), len(pattern), name, self.mapping[name]))
+        return matches
+
+    def find(self, text, default=None):
+        """
+        Find the best government mention in the text: the longest one, the
+        first in the text if they are as long
+
+        Args:
+            text (str): the text to search
+            default (tuple, optional): returned if there is no mention, the
+                default of the matcher if not given
+
+        Returns:
+            match (tuple): (name, value) of the mention
+        """
+        best = None
+        for start, length, name, value in self.find_all(text or ''):
+            if best is None or length > best[1] or (length == best[1] and start < best[0]):
+                best = (start, length, name, value)
+        if best is None:
+            return default if default is not None else self.default
+        return best[2], best[3]
+
+    def find_many(self, texts, default=None):
+        """
+        Find the best government mention of every text
+
+        Args:
+            texts (list or pandas Series): the texts to search
+            default (tuple, optional): returned if there is no mention
+
+        Returns:
+            matches (list or pandas DataFrame): (name, value) per text, a
+                Series gives a DataFrame with name and value columns on its index
+        """
+        results = [self.find(text, default) for text in texts]
+        if type(texts).__name__ != 'Series':
+            return results
+        import pandas as pd
+        results = [result if result is not None else (None, None) for result in results]
+        return pd.DataFrame(results, index=texts.index, columns=['name', 'value'])
+
+
+# 'مفقود' (missing) is the answer when no government is found, not a government
+WEBSITE_GOV_MATCHER = GovMatcher({gov: english for gov, english in GOVS_MAPPING_V2.items() if english != 'Null'},
+                                 default=('مفقود', 'Null'), normalizer=normalize)
+FB_GOV_MATCHER = GovMatcher(EGYPT_GOVS, normalizer=normalize)
@@ -0,0 +1,336 @@
+import os
+import sqlite3
+from itertools import combinations
+from time import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from image_inventory import SKIPPED_SUFFIXES
+from image_store import file_sha256
+
+DEFAULT_PATH = 'image_hashes.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (sha256 TEXT PRIMARY KEY, phash TEXT, dhash TEXT, width INTEGER, height INTEGER);
+"""
+
+# sqlite limits the number of parameters of a query
+BATCH = 500
+# size of the image for the DCT of the pHash
+PHASH_SIZE = 32
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _bits_to_int(bits):
+    return int(''.join('1' if bit else '0' for bit in bits.ravel()), 2)
+
+
+def phash(image, size=8):
+    """
+    Perceptual hash: the signs of the lowest frequencies of the DCT of the
+    grayscale image against their median, robust to resizing and re-encoding
+
+    Args:
+        image (PIL Image): the image
+        size (int, optional): side of the frequencies kept, size * size bits
+
+    Returns:
+        hash (int): the hash
+    """
+    from PIL import Image
+    pixels = np.asarray(image.convert('L').resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (DCT @ pixels @ DCT.T)[:size, :size]
+    # the DC term is the mean brightness, not a shape
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+def dhash(image, size=8):
+    """
+    Difference hash: whether each pixel of the grayscale image is brighter
+    than its right neighbour
+
+    Args:
+        image (PIL Image): the image
+        size (int, optional): side of the hash, size * size bits
+
+    Returns:
+        hash (int): the hash
+    """
+    from PIL import Image
+    pixels = np.asarray(image.convert('L').resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def hash_image(path):
+    """
+    pHash, dHash and size of an image file, run in the worker processes
+
+    Returns:
+        hashes (tuple): (phash, dhash, width, height), Nones if the file
+            can't be decoded
+    """
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            # a JPEG is decoded at a fraction of its size, enough for 32 pixels
+            image.draft('L', (PHASH_SIZE * 2, PHASH_SIZE * 2))
+            return phash(image), dhash(image), width, height
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None, None, None, None
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class HashCache:
+    """
+    Perceptual hashes stored in a sqlite file and keyed by the sha256 of the
+    image content, so a copy, a renamed or a moved image is never decoded again
+
+    Args:
+        path (str, optional): path of the sqlite file, created if it doesn't exist
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def lookup(self, digests):
+        """
+        Return {sha256: (phash, dhash, width, height)} of the digests in the cache
+        """
+        digests = list(digests)
+        found = {}
+        for i in range(0, len(digests), BATCH):
+            chunk = digests[i:i + BATCH]
+            rows = self._db.execute(f"SELECT sha256, phash, dhash, width, height FROM hashes"
+                                    f" WHERE sha256 IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            # the 64 bits hashes don't fit the signed integers of sqlite, they are stored in hex
+            found.update((row[0], (int(row[1], 16) if row[1] else None, int(row[2], 16) if row[2] else None,
+                                   row[3], row[4])) for row in rows)
+        return found
+
+    def store(self, hashes):
+        """
+        Store {sha256: (phash, dhash, width, height)}
+        """
+        self._db.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                             [(digest, None if p is None else f'{p:x}', None if d is None else f'{d:x}', w, h)
+                              for digest, (p, d, w, h) in hashes.items()])
+
+    def close(self):
+        self._db.close()
+
+
+def list_images(images_path):
+    """
+    Images of the person folders of images_path
+
+    Returns:
+        images (pandas DataFrame): person, file and path of every image
+    """
+    rows = []
+    with os.scandir(images_path) as folders:
+        for folder in folders:
+            if folder.is_dir():
+                with os.scandir(folder.path) as entries:
+                    rows.extend((folder.name, entry.name, entry.path) for entry in entries
+                                if entry.is_file() and not entry.name.endswith(SKIPPED_SUFFIXES))
+    return pd.DataFrame(rows, columns=['person', 'file', 'path'])
+
+
+def compute_hashes(images, cache=None, workers=None):
+    """
+    Add the perceptual hashes to the images. The files are identified by their
+    sha256 (read in a thread pool, or taken from a sha256 column), only the
+    images missing from the cache are decoded, in a process pool.
+
+    Args:
+        images (pandas DataFrame): a path column, see list_images
+        cache (HashCache, optional): the cache, image_hashes.db by default
+        workers (int, optional): number of decoding processes, the number of CPUs by default
+
+    Returns:
+        images (pandas DataFrame): images with sha256, phash, dhash, width and height
+    """
+    t0 = time()
+    cache = cache or HashCache()
+    images = images.copy()
+    if 'sha256' not in images:
+        with ThreadPoolExecutor(8) as pool:
+            images['sha256'] = list(pool.map(file_sha256, images['path']))
+    unique = images.drop_duplicates('sha256')
+    known = cache.lookup(unique['sha256'])
+    missing = unique[~unique['sha256'].isin(list(known))]
+    if len(missing):
+        with ProcessPoolExecutor(workers) as pool:
+            decoded = dict(zip(missing['sha256'], pool.map(hash_image, missing['path'], chunksize=64)))
+        cache.store(decoded)
+        known.update(decoded)
+    values = [known[digest] for digest in images['sha256']]
+    # the hashes stay python ints, 64 bits don't fit an int64 and a float loses them
+    for k, column in enumerate(['phash', 'dhash', 'width', 'height']):
+        images[column] = pd.Series([value[k] for value in values], index=images.index, dtype=object)
+    images[['width', 'height']] = images[['width', 'height']].astype('Int64')
+    t1 = time() - t0
+    print(f"Hash {len(images)} images ({len(missing)} decoded) in {t1}")
+    return images
+
+
+# number of set bits of every byte, for the hamming distances of numpy arrays
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hamming_many(a, b):
+    """
+    Hamming distances of two uint64 arrays, element by element
+    """
+    return POPCOUNT[(a ^ b).view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def _flip_masks(bits, radius):
+    # the masks of up to radius set bits among bits: the values within radius of 0
+    return [sum(1 << bit for bit in flipped) for r in range(radius + 1) for flipped in combinations(range(bits), r)]
+
+
+def near_pairs(hashes, radius, chunks=4):
+    """
+    Pairs of hashes within radius bits, with a multi-index hash table: the
+    hashes are cut in chunks, and two hashes within radius bits have a chunk
+    within radius // chunks bits (pigeonhole), found by sorted lookups of
+    that chunk with its bits flipped. Only these candidates are compared.
+
+    Args:
+        hashes (numpy array): the uint64 hashes, without repeats (the equal
+            hashes would all be candidates of each other)
+        radius (int): maximum hamming distance
+        chunks (int, optional): number of chunks of the 64 bits
+
+    Returns:
+        pairs (numpy array): (i, j) rows with i < j
+    """
+    bits = 64 // chunks
+    masks = np.array(_flip_masks(bits, radius // chunks), dtype=np.uint64)
+    positions = np.arange(len(hashes))
+    found = []
+    for chunk in range(chunks):
+        values = (hashes >> np.uint64(chunk * bits)) & np.uint64((1 << bits) - 1)
+        order = np.argsort(values, kind='stable')
+        sorted_values = values[order]
+        for mask in masks:
+            queries = values ^ mask
+            start = np.searchsorted(sorted_values, queries, 'left')
+            counts = np.searchsorted(sorted_values, queries, 'right') - start
+            i = np.repeat(positions, counts)
+            # the runs start[k]:start[k] + counts[k] of the matches, flattened
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            j = order[np.repeat(start, counts) + offsets]
+            keep = i < j
+            i, j = i[keep], j[keep]
+            close = hamming_many(hashes[i], hashes[j]) <= radius
+            found.append(np.column_stack([i[close], j[close]]))
+    pairs = np.concatenate(found) if found else np.empty((0, 2), dtype=np.int64)
+    return np.unique(pairs, axis=0)
+
+
+def image_clusters(images, radius=6, within_person=False):
+    """
+    Group the near-duplicate images: a pHash and a dHash within radius bits
+    of another image of the cluster
+
+    Args:
+        images (pandas DataFrame): person, file and the hashes and sizes of compute_hashes
+        radius (int, optional): maximum hamming distance of the 64 bits
+            hashes, a resized or re-encoded copy is within 2 or 3 bits
+        within_person (bool, optional): only join the images of the same
+            person, False compares the whole corpus
+
+    Returns:
+        clusters (pandas DataFrame): the images in a cluster of 2 or more, on
+            the index of images, with the cluster number and keep (the image
+            of the cluster with the most pixels for each person, the others
+            are the copies to delete)
+    """
+    hashed = images[images['phash'].notna()]
+    phashes = np.array([int(value) for value in hashed['phash']], dtype=np.uint64)
+    dhashes = np.array([int(value) for value in hashed['dhash']], dtype=np.uint64)
+    # the equal pHashes are one entry of the table
+    unique, first = np.unique(phashes, return_inverse=True)
+    members = pd.Series(np.arange(len(hashed))).groupby(first).apply(list)
+    pairs = near_pairs(unique, radius)
+    persons = hashed['person'].to_numpy()
+    # the equal pHashes are joined to the first member (of the same person within_person)
+    candidates = []
+    for group in members:
+        firsts = {}
+        for i in group:
+            owner = persons[i] if within_person else None
+            if owner in firsts:
+                candidates.append((firsts[owner], i))
+            else:
+                firsts[owner] = i
+    candidates += [(i, j) for a, b in pairs for i in members[a] for j in members[b]]
+
+    # union-find of the images over the candidates confirmed by their dHash
+    parent = list(range(len(hashed)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in candidates:
+        if within_person and persons[i] != persons[j]:
+            continue
+        if hamming(int(dhashes[i]), int(dhashes[j])) <= radius:
+            parent[find(i)] = find(j)
+
+    roots = np.array([find(i) for i in range(len(hashed))])
+    sizes = pd.Series(roots).map(pd.Series(roots).value_counts()).to_numpy()
+    clusters = hashed[sizes > 1].copy()
+    clusters.insert(0, 'cluster', pd.factorize(roots[sizes > 1])[0])
+    pixels = clusters['width'] * clusters['height']
+    best = clusters.assign(pixels=pixels).sort_values('pixels', ascending=False).groupby(['cluster', 'person']).head(1)
+    clusters['keep'] = clusters.index.isin(best.index)
+    return clusters.sort_values(['cluster', 'person', 'keep'], ascending=[True, True, False], kind='stable')
+
+
+def find_duplicate_images(images_path, radius=6, within_person=True, cache=None, workers=None):
+    """
+    Near-duplicate images of the person folders of images_path
+
+    Args:
+        images_path (str): the folder of the person image folders
+        radius (int, optional): see image_clusters
+        within_person (bool, optional): see image_clusters
+        cache (HashCache, optional): the hash cache, see compute_hashes
+        workers (int, optional): number of decoding processes
+
+    Returns:
+        clusters (pandas DataFrame): see image_clusters
+    """
+    t0 = time()
+    images = compute_hashes(list_images(images_path), cache, workers)
+    clusters = image_clusters(images, radius, within_person)
+    t1 = time() - t0
+    print(f"Found {clusters['cluster'].nunique()} clusters of {len(clusters)} images in {t1}")
+    return clusters
@@ -0,0 +1,162 @@
+import os
+import json
+from time import time
+
+import pandas as pd
+
+# files of a person folder that are not images: the download manifest and temp files
+SKIPPED_SUFFIXES = ('.json', '.part', '.tmp')
+
+
+def index_path_of(images_path):
+    """
+    Path of the sidecar index of an images folder: next to it, so the folder
+    itself only holds the person folders
+    """
+    return os.path.normpath(images_path) + '.inventory.json'
+
+
+def image_id(file_name):
+    """
+    Person id of an image file name, e.g. 0012 for 0012_3.jpg (None if there is no id)
+    """
+    head, sep, _ = file_name.partition('_')
+    return head if sep and head.isdigit() else None
+
+
+class ImageInventory:
+    """
+    Index of the person folders of an images folder: the name, size and
+    mtime of every image, built with one os.scandir walk. The index is saved
+    in a sidecar JSON file and refreshed incrementally: only the folders whose
+    mtime changed (images added, removed or renamed) are listed again.
+
+    Args:
+        images_path (str): the folder of the person image folders
+        index_path (str, optional): path of the sidecar index, next to
+            images_path by default
+    """
+
+    def __init__(self, images_path, index_path=None):
+        self.images_path = images_path
+        self.index_path = index_path or index_path_of(images_path)
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                self.people = json.load(f)['people']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self.people = {}
+        self.rescanned = 0
+
+    def refresh(self, save=True):
+        """
+        Walk images_path once and list again the new and changed person folders
+
+        Args:
+            save (bool, optional): save the index after the refresh
+
+        Returns:
+            inventory (ImageInventory): self
+        """
+        t0 = time()
+        people = {}
+        self.rescanned = 0
+        with os.scandir(self.images_path) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                mtime = folder.stat().st_mtime_ns
+                entry = self.people.get(folder.name)
+                if entry is None or entry['mtime'] != mtime:
+                    entry = {'mtime': mtime, 'files': self._scan(folder.path)}
+                    self.rescanned += 1
+                people[folder.name] = entry
+        self.people = people
+        if save:
+            self.save()
+        print(f"Inventory of {len(people)} people ({self.rescanned} folders listed) in {time() - t0}")
+        return self
+
+    @staticmethod
+    def _scan(path):
+        files = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(SKIPPED_SUFFIXES):
+                    stat = entry.stat()
+                    files.append([entry.name, stat.st_size, stat.st_mtime_ns])
+        files.sort()
+        return files
+
+    def save(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'images_path': self.images_path, 'people': self.people}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def rename(self, old, new):
+        """
+        Record the rename of a person folder without listing it again
+        """
+        self.people[str(new)] = self.people.pop(str(old))
+
+    def folders(self):
+        return list(self.people)
+
+    def files(self, folder):
+        """
+        Names of the images of a person folder ([] if the folder doesn't exist)
+        """
+        entry = self.people.get(str(folder))
+        return [name for name, _, _ in entry['files']] if entry else []
+
+    def __contains__(self, folder):
+        return str(folder) in self.people
+
+    def __len__(self):
+        return len(self.people)
+
+    def to_frame(self):
+        """
+        One row per person folder
+
+        Returns:
+            inventory (pandas DataFrame): folder, number_of_images, images_size
+                (bytes), images_mtime (latest image mtime) and image_ids (the
+                person ids written in the file names)
+        """
+        rows = []
+        for folder, entry in self.people.items():
+            files = entry['files']
+            rows.append((folder, len(files), sum(size for _, size, _ in files),
+                         pd.NaT if not files else pd.Timestamp(max(mtime for _, _, mtime in files), unit='ns'),
+                         sorted({image_id(name) for name, _, _ in files} - {None})))
+        return pd.DataFrame(rows, columns=['folder', 'number_of_images', 'images_size', 'images_mtime', 'image_ids'])
+
+
+def join_inventory(df, inventory, on='name_arabic', columns=('number_of_images',)):
+    """
+    Join the inventory to the people in one merge on their folder name
+
+    Args:
+        df (pandas DataFrame): information of people
+        inventory (ImageInventory or pandas DataFrame): the refreshed
+            inventory or its to_frame(), to join many chunks
+        on (str, optional): the column holding the folder name of the person
+        columns (tuple, optional): the inventory columns to join, replaced if
+            df has them already
+
+    Returns:
+        df (pandas DataFrame): df with the columns, 0 images for the people without a folder
+    """
+    frame = inventory if isinstance(inventory, pd.DataFrame) else inventory.to_frame()
+    frame = frame[['folder'] + list(columns)]
+    keys = df[on].astype(str)
+    joined = pd.DataFrame({'folder': keys.to_numpy()}, index=df.index).merge(frame, on='folder', how='left')
+    joined.index = df.index
+    df = df.drop(columns=list(columns), errors='ignore')
+    for column in columns:
+        values = joined[column]
+        if column == 'number_of_images':
+            values = values.fillna(0).astype(int)
+        df[column] = values
+    return df
@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import threading
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+
+from image_inventory import SKIPPED_SUFFIXES
+from file_links import link_file
+
+# the per person manifest of the scraper (scraping-website/image_downloader.py)
+MANIFEST = 'manifest.json'
+
+
+def store_path_of(images_path):
+    """
+    Path of the image store of an images folder: next to it
+    """
+    return os.path.normpath(images_path) + '.store'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _known_hashes(person_dir):
+    # file -> (sha256, size) of the manifest of the scraper, so its images aren't
+    # read again, and the mtime of the manifest: a file modified after it was
+    # edited in place and must be hashed again, even with the same size
+    path = os.path.join(person_dir, MANIFEST)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return {entry['file']: (entry['sha256'], entry['size']) for entry in json.load(f)}, \
+                os.stat(path).st_mtime_ns
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        return {}, None
+
+
+class ImageStore:
+    """
+    Content-addressed store of the images: every image is one blob named by
+    the sha256 of its content (blobs/ab/abcd...), so the same photo of
+    several people or sources is stored once. A snapshot records the images
+    of every person as {person: {file name: sha256}}; checking it out builds
+    the person folders as hardlinks or symlinks to the blobs, a working copy
+    costs folders and links, not bytes.
+
+    The blobs are copies (or copy-on-write clones) of the images added, never
+    links to them. Cleaning a checkout (deleting or renaming files and
+    folders) never changes the blobs, but an image edited in place through a
+    hardlink of a checkout would change its blob.
+
+    Args:
+        root (str): folder of the store
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(f'{root}/blobs', exist_ok=True)
+        os.makedirs(f'{root}/snapshots', exist_ok=True)
+
+    def blob_path(self, sha256):
+        return f'{self.root}/blobs/{sha256[:2]}/{sha256}'
+
+    def _add_blob(self, path, sha256):
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            return False
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp_path = f'{blob}.{os.getpid()}.{threading.get_ident()}.tmp'
+        # never a link to the source image: a write through a checkout would
+        # change the raw dataset. A clone shares the blocks where the file
+        # system can, a copy elsewhere
+        link_file(path, tmp_path, 'reflink')
+        os.replace(tmp_path, blob)
+        return True
+
+    def add_tree(self, images_path, name, workers=8):
+        """
+        Add the images of the person folders of images_path and save their
+        snapshot. The hashes of the scraper manifests are trusted when the size
+        matches and the image isn't newer than the manifest, the other images
+        are hashed in a thread pool.
+
+        Args:
+            images_path (str): the folder of the person image folders
+            name (str): name of the snapshot
+            workers (int, optional): number of hashing threads
+
+        Returns:
+            snapshot (dict): {person: {file name: sha256}}
+        """
+        t0 = time()
+        files = []
+        snapshot = {}
+        with os.scandir(images_path) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                # the folders without images are kept too, like copytree
+                snapshot[folder.name] = {}
+                known, manifest_mtime = _known_hashes(folder.path)
+                with os.scandir(folder.path) as entries:
+                    for entry in entries:
+                        if entry.is_file() and not entry.name.endswith(SKIPPED_SUFFIXES):
+                            sha256, size = known.get(entry.name, (None, None))
+                            stat = entry.stat()
+                            if size != stat.st_size or stat.st_mtime_ns > manifest_mtime:
+                                sha256 = None
+                            files.append((folder.name, entry.name, entry.path, sha256))
+
+        def add(item):
+            person, file_name, path, sha256 = item
+            sha256 = sha256 or file_sha256(path)
+            return person, file_name, sha256, self._add_blob(path, sha256)
+
+        added = 0
+        with ThreadPoolExecutor(workers) as pool:
+            for person, file_name, sha256, new in pool.map(add, files):
+                snapshot[person][file_name] = sha256
+                added += new
+        self.save_snapshot(name, snapshot)
+        t1 = time() - t0
+        print(f"Store {len(files)} images of {len(snapshot)} people ({added} new blobs) in {t1}")
+        return snapshot
+
+    def save_snapshot(self, name, snapshot):
+        path = f'{self.root}/snapshots/{name}.json'
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def load_snapshot(self, name):
+        with open(f'{self.root}/snapshots/{name}.json', encoding='utf-8') as f:
+            return json.load(f)
+
+    def snapshots(self):
+        return sorted(name[:-len('.json')] for name in os.listdir(f'{self.root}/snapshots') if name.endswith('.json'))
+
+    def checkout(self, snapshot, to_path, mode='hardlink'):
+        """
+        Build the person folders of a snapshot in to_path, as links to the blobs
+
+        Args:
+            snapshot (dict or str): the snapshot or its name
+            to_path (str): the new images folder, it must not exist
+            mode (str, optional): 'hardlink', 'symlink', 'reflink' or 'copy',
+                see file_links.link_file
+
+        Returns:
+            count (int): number of images in to_path
+        """
+        t0 = time()
+        if isinstance(snapshot, str):
+            snapshot = self.load_snapshot(snapshot)
+        os.makedirs(to_path)
+        count = 0
+        for person, files in snapshot.items():
+            os.makedirs(f'{to_path}/{person}')
+            for file_name, sha256 in files.items():
+                link_file(self.blob_path(sha256), f'{to_path}/{person}/{file_name}', mode)
+                count += 1
+        t1 = time() - t0
+        print(f"Check out {count} images of {len(snapshot)} people in {to_path} in {t1}")
+        return count
+
+    def gc(self):
+        """
+        Delete the blobs of no snapshot
+
+        Returns:
+            count (int): number of blobs deleted
+        """
+        used = {sha256 for name in self.snapshots() for files in self.load_snapshot(name).values()
+                for sha256 in files.values()}
+        count = 0
+        for prefix in os.listdir(f'{self.root}/blobs'):
+            for blob in os.listdir(f'{self.root}/blobs/{prefix}'):
+                if blob not in used:
+                    os.remove(f'{self.root}/blobs/{prefix}/{blob}')
+                    count += 1
+        print(f"Deleted {count} unused blobs of {self.root}")
+        return count
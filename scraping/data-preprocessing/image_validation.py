@@ -0,0 +1,162 @@
+import os
+import json
+from time import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import pandas as pd
+
+from image_inventory import SKIPPED_SUFFIXES
+
+# EXIF tag of the orientation
+ORIENTATION = 0x0112
+# the last bytes of a complete file: a truncated download misses them
+END_MARKERS = {'JPEG': (b'\xff\xd9',), 'PNG': (b'IEND\xaeB`\x82',), 'GIF': (b';',)}
+COLUMNS = ['person', 'file', 'path', 'mtime', 'size', 'format', 'width', 'height', 'orientation', 'ok', 'error']
+
+
+def validation_path_of(images_path):
+    """
+    Path of the validation index of an images folder: next to it, like the inventory index
+    """
+    return os.path.normpath(images_path) + '.validation.json'
+
+
+def probe_image(path, decode=False):
+    """
+    Read the header of an image: format, size and EXIF orientation, and check
+    that the file is complete (the end marker of JPEG, PNG and GIF files)
+    without decoding it; a file without its end marker is decoded before it
+    is marked invalid. Run in the worker threads (or processes with decode).
+
+    Args:
+        path (str): path of the image
+        decode (bool, optional): decode the whole image too, slower but it
+            finds the corrupted data between a valid header and end marker
+
+    Returns:
+        record (dict): format, width, height, orientation, ok and error (None
+            if the image is valid)
+    """
+    from PIL import Image
+    record = {'format': None, 'width': None, 'height': None, 'orientation': None, 'ok': False, 'error': None}
+    try:
+        with Image.open(path) as image:
+            record['format'] = image.format
+            record['width'], record['height'] = image.size
+            record['orientation'] = image.getexif().get(ORIENTATION, 1)
+            if decode:
+                image.load()
+    except Image.UnidentifiedImageError:
+        # an HTML error page or an empty file saved as an image
+        record['error'] = 'not an image'
+        return record
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+        record['error'] = str(e) or type(e).__name__
+        return record
+    markers = END_MARKERS.get(record['format'])
+    if markers and not decode:
+        with open(path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            file.seek(max(0, file.tell() - 32))
+            tail = file.read().rstrip(b'\x00\r\n ')
+        if not tail.endswith(markers):
+            # a valid file may have data after its end marker (the video of a
+            # motion photo, an appended trailer): only a failed decode is an error
+            try:
+                with Image.open(path) as image:
+                    image.load()
+            except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+                record['error'] = 'truncated: ' + (str(e) or type(e).__name__)
+                return record
+    record['ok'] = True
+    return record
+
+
+def _list_files(images_path):
+    files = []
+    with os.scandir(images_path) as folders:
+        for folder in folders:
+            if folder.is_dir():
+                with os.scandir(folder.path) as entries:
+                    for entry in entries:
+                        if entry.is_file() and not entry.name.endswith(SKIPPED_SUFFIXES):
+                            stat = entry.stat()
+                            files.append((folder.name, entry.name, entry.path, stat.st_mtime_ns, stat.st_size))
+    return files
+
+
+def validate_images(images_path, decode=False, workers=8, index_path=None):
+    """
+    Validate the images of the person folders of images_path, in parallel,
+    and keep their metadata in a sidecar index. A re-run only reads the
+    images whose mtime or size changed (or all of them when decode is asked
+    for images only probed before).
+
+    Args:
+        images_path (str): the folder of the person image folders
+        decode (bool, optional): decode the images, see probe_image; the
+            decoding runs in a process pool
+        workers (int, optional): number of threads (or processes with decode)
+        index_path (str, optional): path of the sidecar index, next to
+            images_path by default
+
+    Returns:
+        images (pandas DataFrame): person, file, path, mtime, size, format,
+            width, height, orientation, ok and error of every image
+    """
+    t0 = time()
+    index_path = index_path or validation_path_of(images_path)
+    try:
+        with open(index_path, encoding='utf-8') as f:
+            known = json.load(f)['images']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        known = {}
+
+    records = {}
+    todo = []
+    for person, file_name, path, mtime, size in _list_files(images_path):
+        key = f'{person}/{file_name}'
+        record = known.get(key)
+        # 'truncated' alone is the end marker check of older indexes, without the decode
+        if (record and record['mtime'] == mtime and record['size'] == size and (record['decoded'] or not decode)
+                and record.get('error') != 'truncated'):
+            records[key] = record
+        else:
+            records[key] = {'mtime': mtime, 'size': size, 'decoded': decode}
+            todo.append((key, path))
+
+    executor = ProcessPoolExecutor if decode else ThreadPoolExecutor
+    with executor(workers) as pool:
+        probes = pool.map(probe_image, [path for _, path in todo], [decode] * len(todo), chunksize=32)
+        for (key, _), probe in zip(todo, probes):
+            records[key].update(probe)
+
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'images_path': images_path, 'images': records}, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+    rows = [(*key.split('/', 1), f'{images_path}/{key}', *[record[column] for column in COLUMNS[3:]])
+            for key, record in records.items()]
+    images = pd.DataFrame(rows, columns=COLUMNS).astype({'width': 'Int64', 'height': 'Int64', 'orientation': 'Int64'})
+    t1 = time() - t0
+    print(f"Validate {len(images)} images ({len(todo)} read, {(~images['ok']).sum()} invalid) in {t1}")
+    return images
+
+
+def valid_images(images, min_side=0, formats=None):
+    """
+    The valid images of validate_images, filtered by their metadata
+
+    Args:
+        images (pandas DataFrame): the images of validate_images
+        min_side (int, optional): minimum width and height
+        formats (list, optional): the formats kept, e.g. ['JPEG', 'PNG'], all by default
+
+    Returns:
+        images (pandas DataFrame): the images kept
+    """
+    keep = images['ok'] & (images['width'].fillna(0) >= min_side) & (images['height'].fillna(0) >= min_side)
+    if formats is not None:
+        keep &= images['format'].isin(formats)
+    return images[keep]
@@ -0,0 +1,234 @@
+import zlib
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from arabic_normalize import normalize
+
+# prime modulus of the MinHash permutations, the products stay below 2 ** 64
+PRIME = (1 << 31) - 1
+# values of the block columns that mean "unknown": they are compared with every value
+UNKNOWN = ('Null', 'مفقود', '')
+
+
+def name_shingles(name, ngram=3):
+    """
+    Character n-grams of the normalized name, padded with a space at both ends
+
+    Args:
+        name (str): the arabic name
+        ngram (int, optional): length of the n-grams
+
+    Returns:
+        shingles (set): the n-grams
+    """
+    return _ngrams(normalize(name), ngram)
+
+
+def _ngrams(name, ngram):
+    name = f" {name} "
+    if len(name) <= ngram:
+        return {name}
+    return {name[i:i + ngram] for i in range(len(name) - ngram + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures of names: the share of equal values between two
+    signatures estimates the Jaccard similarity of their n-gram sets
+
+    Args:
+        num_perm (int, optional): number of hash permutations (signature length)
+        ngram (int, optional): length of the character n-grams
+        seed (int, optional): seed of the permutations, the signatures of two
+            MinHashers are only comparable with the same seed
+    """
+
+    def __init__(self, num_perm=64, ngram=3, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.a = rng.randint(1, PRIME, num_perm).astype(np.uint64)
+        self.b = rng.randint(0, PRIME, num_perm).astype(np.uint64)
+
+    def signatures(self, shingle_sets, chunksize=5000):
+        """
+        Compute the signatures of a list of n-gram sets
+
+        Args:
+            shingle_sets (list): the n-gram sets (see name_shingles)
+            chunksize (int, optional): number of sets hashed together, bounds the memory
+
+        Returns:
+            signatures (numpy array): one row of num_perm uint32 per set
+        """
+        signatures = np.empty((len(shingle_sets), self.num_perm), dtype=np.uint32)
+        # the n-grams of names repeat a lot, hash each of them once
+        hash_of = {}
+        for start in range(0, len(shingle_sets), chunksize):
+            chunk = shingle_sets[start:start + chunksize]
+            for shingles in chunk:
+                for shingle in shingles:
+                    if shingle not in hash_of:
+                        hash_of[shingle] = zlib.crc32(shingle.encode('utf-8')) % PRIME
+            hashes = np.array([hash_of[shingle] for shingles in chunk for shingle in shingles], dtype=np.uint64)
+            offsets = np.cumsum([0] + [len(shingles) for shingles in chunk[:-1]])
+            permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % PRIME
+            # the minimum of every permutation over the n-grams of each set
+            signatures[start:start + len(chunk)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return signatures
+
+
+def _band_keys(signatures, bands, seed=1):
+    # every band of rows is folded into one uint64 key
+    rows = signatures.shape[1] // bands
+    multipliers = np.random.RandomState(seed).randint(1, 1 << 62, rows, dtype=np.int64).astype(np.uint64)
+    keys = np.empty((len(signatures), bands), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for band in range(bands):
+            keys[:, band] = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1)
+    return keys
+
+
+def _groups(keys, members, max_bucket):
+    # the runs of equal rows of keys with 2 to max_bucket rows and at least one
+    # of the members, as arrays of row numbers
+    order = np.lexsort(keys.T[::-1])
+    sorted_keys = keys[order]
+    change = np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+    bounds = np.flatnonzero(np.concatenate(([True], change, [True])))
+    starts, ends = bounds[:-1], bounds[1:]
+    with_members = np.add.reduceat(members[order].astype(np.int64), starts) > 0
+    keep = (ends - starts > 1) & (ends - starts <= max_bucket) & with_members
+    return [order[start:end] for start, end in zip(starts[keep], ends[keep])]
+
+
+def lsh_candidates(signatures, blocks, unknown, bands=16, max_bucket=500):
+    """
+    Candidate pairs of similar signatures in the same block, with LSH banding:
+    two signatures are candidates if all the rows of one band are equal
+
+    Args:
+        signatures (numpy array): the MinHash signatures
+        blocks (numpy array): one row of integer block codes per signature
+        unknown (numpy array): True where the block code is unknown, such a
+            code is compared with every code of its column
+        bands (int, optional): number of bands, num_perm must be a multiple of it
+        max_bucket (int, optional): buckets larger than this are skipped, they
+            are common names more than duplicates
+
+    Returns:
+        pairs (set): (i, j) row numbers with i < j
+    """
+    band_keys = _band_keys(signatures, bands)
+    pairs = set()
+    patterns = {tuple(row) for row in unknown}
+    for pattern in patterns:
+        pattern = np.array(pattern, dtype=bool)
+        known = ~pattern
+        # the records with this unknown pattern meet everybody on the known columns
+        members = np.all(unknown == pattern, axis=1)
+        for band in range(bands):
+            keys = np.column_stack([blocks[:, known], band_keys[:, band]]).astype(np.uint64)
+            for group in _groups(keys, members, max_bucket):
+                for i, j in combinations(group.tolist(), 2):
+                    # an exact block is one pattern, the other pairs need an unknown record
+                    if (pattern.any() and not (members[i] or members[j])) or \
+                            (not pattern.any() and not (members[i] and members[j])):
+                        continue
+                    pairs.add((i, j) if i < j else (j, i))
+    return pairs
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def find_near_duplicates(df, column='name_arabic', blocks=('government_english', 'year'), threshold=0.7,
+                         num_perm=64, bands=16, ngram=3, unknown=UNKNOWN, max_bucket=500):
+    """
+    Find the people recorded more than once under spelling variants of their
+    name: the records with the same normalized name in a block are grouped,
+    then the MinHash/LSH candidates are scored by the Jaccard similarity of
+    their n-grams and joined into clusters. The records are only compared in
+    the same block (e.g. government and missing year), unknown block values
+    are compared with every block.
+
+    Args:
+        df (pandas DataFrame): the records, several sources can be concatenated
+        column (str, optional): the name column
+        blocks (tuple, optional): the blocking columns, () to compare everybody
+        threshold (float, optional): minimum Jaccard similarity of a pair
+        num_perm (int, optional): MinHash signature length
+        bands (int, optional): LSH bands, more bands find less similar pairs
+        ngram (int, optional): length of the character n-grams
+        unknown (tuple, optional): block values that mean unknown, NaN included
+        max_bucket (int, optional): LSH buckets larger than this are skipped
+
+    Returns:
+        clusters (pandas DataFrame): the records in a cluster of 2 or more, on
+            the index of df, with the cluster number, the name, the block
+            columns and the score (best similarity to another member)
+    """
+    blocks = list(blocks)
+    names = df[column].fillna('').astype(str)
+    normalized = names.map(normalize)
+    block_values = df[blocks].astype(object).where(df[blocks].notna(), None) if blocks \
+        else pd.DataFrame(index=df.index)
+    unknown_mask = block_values.isna() | block_values.isin(list(unknown))
+    block_codes = np.column_stack([pd.factorize(block_values[name].where(~unknown_mask[name], None))[0]
+                                   for name in blocks]) if blocks else np.zeros((len(df), 0), dtype=np.int64)
+    unknown_mask = unknown_mask.to_numpy()
+
+    # the same normalized name in the same block: one representative, score 1
+    group_keys = pd.DataFrame(block_codes).assign(name=normalized.to_numpy())
+    group_of = group_keys.groupby(list(group_keys.columns), sort=False).ngroup().to_numpy()
+    representatives = pd.Series(np.arange(len(df))).groupby(group_of).first().to_numpy()
+
+    shingles = [_ngrams(name, ngram) for name in normalized.to_numpy()[representatives]]
+    signatures = MinHasher(num_perm, ngram).signatures(shingles)
+    candidates = lsh_candidates(signatures, block_codes[representatives], unknown_mask[representatives],
+                                bands, max_bucket)
+
+    # union-find of the representatives over the pairs above the threshold
+    parent = list(range(len(representatives)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    best = np.zeros(len(representatives))
+    partial = unknown_mask[representatives].any(axis=1)
+    attach = {}
+    for i, j in candidates:
+        score = jaccard(shingles[i], shingles[j])
+        if score < threshold:
+            continue
+        best[i] = max(best[i], score)
+        best[j] = max(best[j], score)
+        if partial[i] != partial[j]:
+            # a record with an unknown block only joins its best match, or it
+            # would bridge the clusters of different blocks
+            i, j = (i, j) if partial[i] else (j, i)
+            if score > attach.get(i, (0, None))[0]:
+                attach[i] = (score, j)
+        else:
+            parent[find(i)] = find(j)
+    for i, (score, j) in attach.items():
+        parent[find(i)] = find(j)
+
+    roots = np.array([find(i) for i in range(len(representatives))])
+    cluster_of = roots[group_of]
+    score = best[group_of]
+    # the records sharing their representative are exact duplicates
+    score[pd.Series(group_of).duplicated(keep=False).to_numpy()] = 1.0
+    sizes = pd.Series(cluster_of).value_counts()
+    in_cluster = pd.Series(cluster_of).map(sizes).to_numpy() > 1
+
+    clusters = df.loc[in_cluster, [column] + blocks].copy()
+    clusters.insert(0, 'cluster', pd.factorize(cluster_of[in_cluster])[0])
+    clusters['score'] = score[in_cluster]
+    return clusters.sort_values(['cluster', 'score'], ascending=[True, False], kind='stable')
@@ -0,0 +1,106 @@
+import os
+import shutil
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+def number_of_images_in(counts):
+    """
+    Filter of the people with one of the numbers of images, e.g. range(1, 3)
+    """
+    counts = list(counts)
+
+    def number_of_images(df):
+        return f"number_of_images in {counts}", df['number_of_images'].isin(counts)
+    return number_of_images
+
+
+def missing_before_year(year):
+    """
+    Filter of the people missing in year or before
+    """
+    def before_year(df):
+        return f"missing in {year} or before", df['year'] <= year
+    return before_year
+
+
+def duplicate_names(column='name_arabic'):
+    """
+    Filter of the people recorded again under the same name, the first record is kept
+    """
+    def duplicates(df):
+        return f"duplicate {column}", df[column].duplicated()
+    return duplicates
+
+
+def plan_deletions(df, filters, path, folder='name_arabic'):
+    """
+    Find the people to delete with all the filters, vectorized over df, and
+    one listing of path. The folder of a person is only deleted when all the
+    people sharing it are deleted, a duplicate doesn't take the images of
+    the record kept.
+
+    Args:
+        df (pandas DataFrame): Information of people
+        filters (list): filters df -> (reason, boolean Series), e.g.
+            number_of_images_in, missing_before_year, duplicate_names
+        path (str): path to the images
+        folder (str, optional): the column of the folder names of people
+
+    Returns:
+        plan (pandas DataFrame): the people to delete, on the index of df, with
+            their folder, the reason (the first filter matching them) and
+            delete_folder (the folder exists and isn't shared with a person kept)
+    """
+    reasons = pd.Series('', index=df.index)
+    victims = pd.Series(False, index=df.index)
+    for f in filters:
+        # every filter sees the people left by the previous ones, like the
+        # deletions run one after the other (a duplicate of a deleted person is kept)
+        reason, mask = f(df[~victims])
+        mask = mask.fillna(False).astype(bool)
+        reasons[mask[mask].index] = reason
+        victims[mask[mask].index] = True
+    folders = df[folder].astype(str)
+    with os.scandir(path) as entries:
+        on_disk = {entry.name for entry in entries if entry.is_dir()}
+    # the folders whose people are all victims
+    only_victims = victims.groupby(folders).all()
+    plan = pd.DataFrame({'folder': folders[victims], 'reason': reasons[victims]})
+    plan['delete_folder'] = plan['folder'].isin(on_disk) & plan['folder'].map(only_victims).astype(bool)
+    # one deletion per folder, even for the people sharing it
+    plan.loc[plan['folder'].duplicated(), 'delete_folder'] = False
+    return plan
+
+
+def delete_people(df, filters, path, folder='name_arabic', dry_run=False, workers=8):
+    """
+    Drop the people matching any of the filters from df and delete their
+    image folders in a thread pool
+
+    Args:
+        df (pandas DataFrame): Information of people, modified in place
+        filters (list): the filters, see plan_deletions
+        path (str): path to the images
+        folder (str, optional): the column of the folder names of people
+        dry_run (bool, optional): only report what would be deleted
+        workers (int, optional): number of deletion threads
+
+    Returns:
+        plan (pandas DataFrame): the report of plan_deletions
+    """
+    t0 = time()
+    plan = plan_deletions(df, filters, path, folder)
+    for reason, count in plan['reason'].value_counts().items():
+        print(f"{'Would delete' if dry_run else 'Delete'} {count} people: {reason}")
+    if not dry_run:
+        df.drop(plan.index, inplace=True)
+        folders = plan['folder'][plan['delete_folder']]
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda name: shutil.rmtree(f'{path}/{name}'), folders))
+    t1 = time() - t0
+    print(f"{'Dry run of' if dry_run else 'Delete'} {len(plan)} people "
+          f"({plan['delete_folder'].sum()} folders) in {t1}")
+    return plan
@@ -0,0 +1,147 @@
+import os
+import json
+
+
+class JsonlSink:
+    """
+    Append-only JSON Lines writer: every record is one line, so writing a page
+    of records only costs the size of that page.
+
+    Args:
+        path (str): path of the .jsonl file, created if it doesn't exist
+        fsync_every (int, optional): fsync the file every fsync_every records
+    """
+
+    def __init__(self, path, fsync_every=100):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.fsync_every = fsync_every
+        self._file = open(path, 'a', encoding='utf-8')
+        self._pending = 0
+        # terminate a line truncated by a crash so the next record stays valid
+        if os.path.getsize(path) > 0:
+            with open(path, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    self._file.write('\n')
+
+    def write(self, records):
+        """
+        Append records (list of dicts) to the file
+        """
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Flush the written records to disk (fsync)
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_jsonl(path):
+    """
+    Stream the records of a JSON Lines file one by one
+
+    Args:
+        path (str): path of the .jsonl file
+
+    Yields:
+        record (dict): one record of the file
+    """
+    with open(path, encoding='utf-8') as file:
+        for n, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # a crash while appending leaves a truncated last line
+                print(f"Skip broken line {n} of {path}")
+
+
+def _last_positions(path, key):
+    # the position of the last record of every key, the records stay on disk
+    last = {}
+    count = 0
+    for n, record in enumerate(iter_jsonl(path)):
+        last[record.get(key, ('no key', n))] = n
+        count += 1
+    return last, count
+
+
+def compact_jsonl(path, key='id'):
+    """
+    Rewrite a JSON Lines file with only the last record of every key, in its
+    place, like export_json. The file is left as is without repeated keys.
+
+    Args:
+        path (str): path of the .jsonl file
+        key (str, optional): the field identifying a record
+
+    Returns:
+        count (int): number of records removed
+    """
+    last, count = _last_positions(path, key)
+    if len(last) == count:
+        return 0
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        for n, record in enumerate(iter_jsonl(path)):
+            if last[record.get(key, ('no key', n))] == n:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    return count - len(last)
+
+
+def export_json(jsonl_path, json_path, key='id'):
+    """
+    Export a JSON Lines file into one compact JSON array, record by record.
+    A person fetched again (changed page or revisit) is appended again to the
+    .jsonl file: only the last record of every key is exported, in its place.
+
+    Args:
+        jsonl_path (str): path of the .jsonl file
+        json_path (str): path of the JSON file to write
+        key (str, optional): the field identifying a record, None exports every record
+
+    Returns:
+        count (int): number of exported records
+    """
+    # first pass: the position of the last record of every key
+    last = _last_positions(jsonl_path, key)[0] if key is not None else {}
+    count = 0
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write('[')
+        for n, record in enumerate(iter_jsonl(jsonl_path)):
+            if key is not None and last[record.get(key, ('no key', n))] != n:
+                continue
+            if count:
+                file.write(',\n')
+            file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            count += 1
+        file.write(']\n')
+    os.replace(tmp_path, json_path)
+    return count
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+from time import time
+
+DEFAULT_PATH = 'translation_cache.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (text TEXT, from_lang TEXT, to_lang TEXT, translated TEXT, used_at REAL,
+                                         PRIMARY KEY (text, from_lang, to_lang));
+CREATE INDEX IF NOT EXISTS translations_used_at ON translations (used_at);
+"""
+
+# sqlite limits the number of parameters of a query
+BATCH = 500
+
+
+# what the free MyMemory API of the translate library answers past its quota
+QUOTA_WARNING = 'MYMEMORY WARNING'
+
+
+def translate_backend(text, from_lang, to_lang):
+    """
+    Translate a text with the translate library, one request
+
+    Args:
+        text (str): the text to translate
+        from_lang (str): the language of the text
+        to_lang (str): the language to translate to
+
+    Returns:
+        translated (str): the translation
+    """
+    from translate import Translator
+    return Translator(from_lang=from_lang, to_lang=to_lang).translate(text)
+
+
+def is_translation(value):
+    """
+    False for the empty answers and the quota warnings of the API
+    """
+    return isinstance(value, str) and bool(value.strip()) and not value.upper().startswith(QUOTA_WARNING)
+
+
+class TranslationCache:
+    """
+    Translations stored in a sqlite file and keyed by (text, from_lang, to_lang),
+    the least recently used are evicted past max_entries. The names are split
+    in words, so a common first name is only translated once for every name
+    holding it. Safe to share between threads.
+
+    Args:
+        path (str, optional): path of the sqlite file, created if it doesn't exist
+        max_entries (int, optional): number of translations kept
+        backend (callable, optional): backend(text, from_lang, to_lang) -> the
+            translation, called once for every missing text
+        split_words (bool, optional): translate the words of the texts, not
+            the whole texts
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=100000, backend=translate_backend, split_words=True):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.backend = backend
+        self.split_words = split_words
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def lookup(self, texts, from_lang, to_lang):
+        """
+        Return {text: translation} of the texts in the cache and mark them as used
+        """
+        texts = list(texts)
+        found = {}
+        with self._lock:
+            for i in range(0, len(texts), BATCH):
+                chunk = texts[i:i + BATCH]
+                rows = self._db.execute(
+                    f"SELECT text, translated FROM translations WHERE from_lang = ? AND to_lang = ?"
+                    f" AND text IN ({', '.join('?' * len(chunk))})", [from_lang, to_lang] + chunk).fetchall()
+                found.update(rows)
+            now = time()
+            self._db.executemany("UPDATE translations SET used_at = ? WHERE text = ? AND from_lang = ? AND to_lang = ?",
+                                 [(now, text, from_lang, to_lang) for text in found])
+        return found
+
+    def store(self, translations, from_lang, to_lang):
+        """
+        Add {text: translation} to the cache and evict the least recently used
+        """
+        now = time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                                 [(text, from_lang, to_lang, translated, now)
+                                  for text, translated in translations.items()])
+            count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute("DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations"
+                                 " ORDER BY used_at LIMIT ?)", (count - self.max_entries,))
+            self._db.execute("COMMIT")
+
+    def translate_many(self, texts, from_lang='ar', to_lang='en'):
+        """
+        Translate a batch of texts: the words of the whole batch are deduplicated,
+        looked up in the cache and only the missing ones are sent to the backend.
+        Every translation is stored as soon as it arrives, so an error or the
+        quota of the API in the middle of a batch loses nothing. The words that
+        can't be translated are kept as they are, and the texts that aren't
+        strings (NaN, None) are returned unchanged.
+
+        Args:
+            texts (list or pandas Series): the texts to translate
+            from_lang (str, optional): the language of the texts
+            to_lang (str, optional): the language to translate to
+
+        Returns:
+            translated (list or pandas Series): the translations, a Series keeps its index
+        """
+        values = list(texts)
+        parts = [(text.split() if self.split_words else [text]) if isinstance(text, str) else None
+                 for text in values]
+        unique = list(dict.fromkeys(part for text_parts in parts if text_parts for part in text_parts))
+        found = self.lookup(unique, from_lang, to_lang)
+        missing = [part for part in unique if part not in found]
+        self.hits += len(unique) - len(missing)
+        self.misses += len(missing)
+        for k, part in enumerate(missing):
+            try:
+                value = self.backend(part, from_lang, to_lang)
+            except Exception as e:
+                print(f"Translation of {part!r} failed: {e!r}")
+                continue
+            if not is_translation(value):
+                if isinstance(value, str) and value.upper().startswith(QUOTA_WARNING):
+                    # every next request gets the same answer until the quota resets
+                    print(f"Translation quota reached, {len(missing) - k} words left untranslated")
+                    break
+                continue
+            self.store({part: value}, from_lang, to_lang)
+            found[part] = value
+        result = [' '.join(found.get(part, part) for part in text_parts) if text_parts is not None else text
+                  for text, text_parts in zip(values, parts)]
+        if type(texts).__name__ == 'Series':
+            import pandas as pd
+            return pd.Series(result, index=texts.index, name=texts.name)
+        return result
+
+    def translate(self, text, from_lang='ar', to_lang='en'):
+        return self.translate_many([text], from_lang, to_lang)[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the translation cache shared by the scrapers, opened at DEFAULT_PATH on first use
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = TranslationCache()
+        return _CACHE
+
+
+def set_cache(cache):
+    """
+    Share another translation cache with the scrapers and return the previous one
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        previous, _CACHE = _CACHE, cache
+        return previous
@@ -0,0 +1,87 @@
+import re
+
+from arabic_content import ARABIC_MAPPING
+
+# joins the names of a batch, names holding it are transliterated one by one
+SEPARATOR = '\n'
+
+
+class Transliterator:
+    """
+    Arabic to English transliteration compiled into a str.translate table:
+    every character is mapped in C instead of a dict lookup and a string
+    concatenation per character in Python.
+
+    Args:
+        mapping (dict): character -> english letters, the characters that are
+            not in it are kept
+        rules (dict, optional): digraphs (strings of several characters) ->
+            english letters, applied before the characters, the longest first
+    """
+
+    def __init__(self, mapping=ARABIC_MAPPING, rules=None):
+        rules = dict(rules or {})
+        # multi character keys can only be rules
+        rules.update({key: value for key, value in mapping.items() if len(key) > 1})
+        # a list indexed by the code point is looked up faster than a dict by
+        # str.translate, the characters past its end raise IndexError and are kept
+        table = str.maketrans({key: value for key, value in mapping.items() if len(key) == 1})
+        self.table = list(range(max(table) + 1 if table else 0))
+        for code, value in table.items():
+            self.table[code] = value
+        self.rules = rules
+        self._pattern = re.compile('|'.join(re.escape(key) for key in sorted(rules, key=len, reverse=True))) \
+            if rules else None
+        # a separator written or matched by the mapping would break the batches
+        self._batchable = not any(SEPARATOR in text for item in list(mapping.items()) + list(rules.items())
+                                  for text in item)
+
+    def _translate(self, text):
+        if self._pattern is not None:
+            text = self._pattern.sub(lambda match: self.rules[match.group()], text)
+        return text.translate(self.table)
+
+    def transliterate(self, name):
+        """
+        Transliterate one name
+
+        Args:
+            name (str): the arabic name
+
+        Returns:
+            name (str): the english name, title cased
+        """
+        return self._translate(name).title()
+
+    def transliterate_many(self, names):
+        """
+        Transliterate a batch of names at once: they are joined, translated
+        and title cased in one call each, then split back
+
+        Args:
+            names (list or pandas Series): the arabic names, the missing
+                values (None/NaN) of a Series are kept
+
+        Returns:
+            names (list or pandas Series): the english names, a Series keeps
+                its index
+        """
+        if type(names).__name__ == 'Series':
+            import pandas as pd
+            values = names.tolist()
+            valid = [i for i, name in enumerate(values) if isinstance(name, str)]
+            for i, name in zip(valid, self.transliterate_many([values[i] for i in valid])):
+                values[i] = name
+            return pd.Series(values, index=names.index, name=names.name, dtype=object)
+        names = list(names)
+        if not names or not self._batchable:
+            return [self.transliterate(name) for name in names]
+        joined = SEPARATOR.join(names)
+        # the separator is not a letter, so title() starts every name again after it
+        mapped = self._translate(joined).title().split(SEPARATOR)
+        if len(mapped) != len(names):
+            return [self.transliterate(name) for name in names]
+        return mapped
+
+
+ARABIC_TRANSLITERATOR = Transliterator(ARABIC_MAPPING)
@@ -1,23 +1,95 @@
 import os
-import json
-import shutil
-import requests
-from time import sleep
-from bs4 import BeautifulSoup
-from urllib3.util import Retry
-from translate import Translator
-from requests.adapters import HTTPAdapter
-from ..data-preprocessing.arabic_content import ARABIC_MAPPING, GOVS_MAPPING_V2
-
-
-def session_request(url, stream=False):
-    session = requests.Session()
-    retry = Retry(connect=3, backoff_factor=5)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    response = session.get(url, stream=stream)
-    return response
+import sys
+from bs4 import BeautifulSoup, SoupStrainer
+from crawl_state import CrawlState
+from rate_control import AdaptiveLimiter
+from crawl_metrics import METRICS
+# the session and the limiter live in http_session, imported from here by the crawlers
+from http_session import (configure_session, get_session, set_adapter_factory, set_rate_limiter,  # noqa: F401
+                          session_request, conditional_request)
+from image_downloader import download_person_images
+
+# data-preprocessing is not an importable package name, so add it to the path
+sys.path.append(os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', 'data-preprocessing'))
+from transliterate import ARABIC_TRANSLITERATOR  # noqa: E402
+from translation_cache import get_cache  # noqa: E402
+from record_sink import JsonlSink, export_json  # noqa: E402
+from gov_matcher import WEBSITE_GOV_MATCHER  # noqa: E402
+
+BASE_URL = "https://atfalmafkoda.com"
+LISTING_PATH = "/ar/seen-him?page={page}&per-page=18"
+
+# BeautifulSoup tree builder, 'lxml' is much faster than 'html.parser' if installed
+PARSER = 'html.parser'
+# only build the nodes that the parse functions read instead of the full document
+TARGETED_PARSING = True
+PERSON_CLASSES = {'person_name', 'date_loss', 'img-fluid'}
+
+
+def _has_person_class(value):
+    # the class attribute isn't split into a list yet while straining
+    if value is None:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return not PERSON_CLASSES.isdisjoint(classes)
+
+
+LISTING_STRAINER = SoupStrainer('button', attrs={'data-target': '#modal_persons_missing'})
+PERSON_STRAINER = SoupStrainer(['h2', 'p', 'h4', 'img'], attrs={'class': _has_person_class})
+
+
+def listing_url(page):
+    return BASE_URL + LISTING_PATH.format(page=page)
+
+
+def set_base_url(base_url="https://atfalmafkoda.com"):
+    """
+    Point the scraper at another host serving the website, e.g. the local
+    stand-in server of http_replay.
+
+    Parameters
+    ----------
+    base_url : str, optional
+        scheme and host of the website. The default is 'https://atfalmafkoda.com'.
+    Returns
+    -------
+    None.
+    """
+    global BASE_URL
+    BASE_URL = base_url.rstrip('/')
+
+
+def is_unchanged_person(base, state, revisit=False):
+    """
+    Whether the person was scrapped before and can't be revalidated with a
+    conditional GET (the server sent no validators), so it is skipped unless revisit.
+    """
+    return (state is not None and not revisit and state.is_seen(base['id'])
+            and not state.conditional_headers(base['URL']))
+
+
+def configure_parser(parser='html.parser', targeted=True):
+    """
+    Choose how the listing and person pages are parsed.
+
+    Parameters
+    ----------
+    parser : str, optional
+        the BeautifulSoup tree builder ('html.parser', 'lxml'). The default is 'html.parser'.
+    targeted : bool, optional
+        only build the tags needed by the parse functions (SoupStrainer). The default is True.
+    Returns
+    -------
+    None.
+    """
+    global PARSER, TARGETED_PARSING
+    PARSER = parser
+    TARGETED_PARSING = targeted
+
+
+def make_soup(content, strainer):
+    return BeautifulSoup(content, PARSER, parse_only=strainer if TARGETED_PARSING else None)
 
 
 def extract_people_url(url):
@@ -34,20 +106,38 @@ def extract_people_url(url):
         list of the links of the content of each person on the page.
     """
     print('********   Extracting URL   ************')
-    cnt = []
     response = session_request(url)
-    content = response.content
-    soup = BeautifulSoup(content, 'html.parser')
+    # an error page left after the retries must not be parsed as an empty page
+    response.raise_for_status()
+    return parse_people_url(response.content)
+
+
+@METRICS.timed('parse_seconds', 'listing', failures='parse_failures_total')
+def parse_people_url(content):
+    """
+    Parse the links of the missing people out of an already fetched listing page.
+
+    Parameters
+    ----------
+    content : bytes or str
+        the HTML content of the listing page.
+    Returns
+    -------
+    cnt : list
+        list of the links of the content of each person on the page.
+    """
+    cnt = []
+    soup = make_soup(content, LISTING_STRAINER)
     for tag in soup.find_all('button', {'class': 'btn ebtn-4 ebtn-sm p-1', 'data-target': '#modal_persons_missing'}):
         cnt.append(
-            {"id": int(tag['data-id']), "URL": "https://atfalmafkoda.com" + tag['data-url']})
+            {"id": int(tag['data-id']), "URL": BASE_URL + tag['data-url']})
     return cnt
 
 
 def find_gov(content):
     """
     Search for the government name in the arabic text content and return the arabic and english
-    government name based on the GOVS_MAPPING dict.
+    government name based on the GOVS_MAPPING dict. The longest name found wins.
 
     Parameters
     ----------
@@ -60,15 +150,7 @@ def find_gov(content):
     gov_english : str
         the english name of the government.
     """
-    gov_arabic = ""
-    gov_english = ""
-    for gov in GOVS_MAPPING_V2.keys():
-        if content.find(gov) >= 0:
-            gov_arabic = gov
-            gov_english = GOVS_MAPPING_V2[gov]
-            return gov_arabic, gov_english
-    gov_arabic = 'مفقود'
-    gov_english = 'Null'
+    gov_arabic, gov_english = WEBSITE_GOV_MATCHER.find(content)
     return gov_arabic, gov_english
 
 
@@ -77,7 +159,8 @@ def translate_content(content, from_language='ar', to_language='en'):
     Translate the content (mostly: name, gov) string from one 
     language (mostly: 'ar') to another (mostly: 'en') using 
     translate open source library. 
-    Note: the library has daily limited times of usage. 
+    Note: the library has daily limited times of usage, so the words are
+    translated once and kept in the translation cache.
 
     Parameters
     ----------
@@ -92,8 +175,7 @@ def translate_content(content, from_language='ar', to_language='en'):
     content_translated : str 
         string of the translated content.
     """
-    translator = Translator(from_lang=from_language, to_lang=to_language)
-    content_translated = translator.translate(content)
+    content_translated = get_cache().translate(content, from_language, to_language)
 
     return content_translated
 
@@ -113,17 +195,10 @@ def mapping_to_english(name):
         string of the mapped name.
     """
 
-    mapped_name = ""
-    for c in name:
-        try:
-            mapped_name += ARABIC_MAPPING[c]
-        except:
-            mapped_name += c
-
-    return mapped_name.title()
+    return ARABIC_TRANSLITERATOR.transliterate(name)
 
 
-def extract_people_info(base, mapping_method="mapping"):
+def extract_people_info(base, mapping_method="mapping", state=None):
     """
     Extract the information from the information page of the person  (id, Name_Arabic, Name_English, Government_Arabic, 
     Government_English, Missing_Date, Current_Age, images).
@@ -134,17 +209,49 @@ def extract_people_info(base, mapping_method="mapping"):
     mapping_method : str, optional
         the method of mapping the arabic name to english name. 
         methods: mapping (default), translating. 
+    state : CrawlState, optional
+        the crawl state, to skip the page if it is not modified since the last crawl.
 
     Returns
     -------
     base : dict
-        the dict of the data about the person after appending the data.
+        the dict of the data about the person after appending the data,
+        None if the page is not modified since the last crawl.
     """
 
     print('********   Extracting INFO   ************')
-    response = session_request(base['URL'])
-    content = response.content
-    soup = BeautifulSoup(content, 'html.parser')
+    if state is None:
+        response = session_request(base['URL'])
+    else:
+        response = conditional_request(
+            base['URL'], state, revalidate=state.is_seen(base['id']))
+        if response is None:
+            print(f"Person {base['id']} is not modified, skipped")
+            return None
+    response.raise_for_status()
+    return parse_people_info(base, response.content, mapping_method)
+
+
+@METRICS.timed('parse_seconds', 'person', failures='parse_failures_total')
+def parse_people_info(base, content, mapping_method="mapping"):
+    """
+    Parse the information of the person out of an already fetched person page.
+    Parameters
+    ----------
+    base : dict
+        the information data about the person.
+    content : bytes or str
+        the HTML content of the person page.
+    mapping_method : str, optional
+        the method of mapping the arabic name to english name.
+        methods: mapping (default), translating.
+
+    Returns
+    -------
+    base : dict
+        the dict of the data about the person after appending the data.
+    """
+    soup = make_soup(content, PERSON_STRAINER)
     name_arabic = soup.find('h2', {"class": "person_name"}).text.strip()
     base['Name_Arabic'] = name_arabic
     if mapping_method == "translating":
@@ -162,50 +269,34 @@ def extract_people_info(base, mapping_method="mapping"):
     base['image'] = []
     for photo in soup.find_all('img', {"class": "img-fluid"}):
         if photo['alt'].strip() == base['Name_Arabic'].strip():
-            base['image'].append("https://atfalmafkoda.com/" + photo['src'])
+            base['image'].append(BASE_URL + "/" + photo['src'])
 
     return base
 
 
-def downlad_extracted_img(base, save_path):
+def downlad_extracted_img(base, save_path, state=None, workers=4):
     """
     Download the images that are extracted from the person content. 
+    The images are downloaded in parallel and deduplicated by content, see
+    image_downloader.download_person_images.
     Parameters
     ----------
     base : dict
          the information data about the person..
     save_path : str
         the path (directory) the data will be saved in it.
+    state : CrawlState, optional
+        the crawl state, to skip the images that are already downloaded.
+    workers : int, optional
+        number of download threads. The default is 4.
     Returns
     -------
     None.
     """
-    imageURLs = base['image']
-    id = base['id']
-    sub = len(str(id))
-    fileName = base['Name_Arabic']
-    os.makedirs((f'{save_path}/{fileName}'), exist_ok=True)
-    imgName = (4 - sub) * '0' + str(id) + '_'
-    base['imageRef'] = imgName + '0' + '.jpg'
-    base['imageRefExtra'] = []
-    n = len(imageURLs)
-    # Prevent any duplicated images by just downloading half of them
-    if n % 2 == 0:
-        n = n//2
-    else:
-        n = n//2 + 1
-    for i in range(n):
-        imageURL = imageURLs[i]
-        r = session_request(imageURL, stream=True)
-        r.raw.decode_content = True
-        currentImagName = imgName + str(i) + '.jpg'
-        print(f"Downloading {fileName} ---- {currentImagName} .....")
-        base['imageRefExtra'].append(currentImagName)
-        with open(f'{save_path}/{fileName}/{currentImagName}', 'wb') as f:
-            shutil.copyfileobj(r.raw, f)
-
-
-def extract_people_info_download_image(pageURL, save_path):
+    download_person_images(base, save_path, state, workers)
+
+
+def extract_people_info_download_image(pageURL, save_path, state=None, revisit=False, failed=None):
     """
     Extract and download the people information in the page. 
     Parameters
@@ -214,6 +305,14 @@ def extract_people_info_download_image(pageURL, save_path):
         the page url to be extracted.
     save_path : str
         the path (directory) the data will be saved in it.
+    state : CrawlState, optional
+        the crawl state, to skip the people and images that didn't change.
+    revisit : bool, optional
+        fetch again the people already scrapped even if their page can't be
+        revalidated with a conditional GET. The default is False.
+    failed : list, optional
+        collects the people that failed, logged and skipped, instead of
+        raising their error. The default is None.
     Returns
     -------
     peapleInfo : list
@@ -222,17 +321,33 @@ def extract_people_info_download_image(pageURL, save_path):
     cnt = extract_people_url(pageURL)
     peapleInfo = []
     for base in cnt:
-        personInfo = extract_people_info(base)
-        downlad_extracted_img(personInfo, save_path)
+        if is_unchanged_person(base, state, revisit):
+            continue
+        try:
+            personInfo = extract_people_info(base, state=state)
+            if personInfo is None:
+                continue
+            downlad_extracted_img(personInfo, save_path, state)
+        except Exception as e:
+            if failed is None:
+                raise
+            print(f"Error while crawling person {base['id']}: {e!r}")
+            failed.append(base)
+            continue
         peapleInfo.append(personInfo)
-        sleep(20)
     return peapleInfo
 
 
-def extract_missing_people_info_to_json(save_path="dataset", number_of_pages=-1):
+def extract_missing_people_info_to_json(save_path="dataset", number_of_pages=-1, state_path=None, resume=True,
+                                        revisit=False, export=True, rate_limiter=None):
     """
     Extract the information from all pages (limited bt number_of_pages) and save 
     to JSON file in the same directory. 
+    Each page is appended to missing_people.jsonl (JSON Lines) as soon as it is
+    scrapped, and exported at the end to missing_people.json.
+    The progress is checkpointed in a crawl state, so a re-run resumes after the
+    completed pages and skips the people and images that didn't change.
+    The requests are paced by an adaptive rate limiter instead of fixed sleeps.
     Parameters
     ----------
     save_path : str, optional
@@ -240,6 +355,18 @@ def extract_missing_people_info_to_json(save_path="dataset", number_of_pages=-1)
         default: the current director/Scrapped_Data.
     number_of_pages : int, optional
         number of pages you want to scrape. The default is 1.
+    state_path : str, optional
+        the path of the crawl state file. The default is save_path/crawl_state.db.
+    resume : bool, optional
+        skip the listing pages completed by a previous run. The default is True.
+    revisit : bool, optional
+        fetch again the people already scrapped even if their page can't be
+        revalidated with a conditional GET. The default is False.
+    export : bool, optional
+        export the JSON Lines file to a compact missing_people.json at the end.
+        The default is True.
+    rate_limiter : rate_control.AdaptiveLimiter, optional
+        the limiter pacing the requests. The default is a new AdaptiveLimiter().
     Returns
     -------
     None.
@@ -248,30 +375,54 @@ def extract_missing_people_info_to_json(save_path="dataset", number_of_pages=-1)
     data = []
     if number_of_pages == -1:
         number_of_pages = 90
-    while page <= number_of_pages:
-        data = extract_people_info_download_image(
-            f'https://atfalmafkoda.com/ar/seen-him?page={page}&per-page=18', f'{save_path}/images')
-        write_json(data, f"{save_path}/missing_people.json")
-        print("\n==>JSON file with page {} scrapped data is successfully scraped in directory".format(page))
-        page += 1
-        sleep(100)
-        print("="*70)
+    METRICS.reset()
+    state = CrawlState(state_path or f"{save_path}/crawl_state.db")
+    completed = state.completed_pages() if resume else set()
+    sink = JsonlSink(f"{save_path}/missing_people.jsonl")
+    previous_limiter = set_rate_limiter(rate_limiter or AdaptiveLimiter())
+    try:
+        while page <= number_of_pages:
+            if page in completed:
+                print(f"==>Page {page} is already scrapped, skipped")
+                page += 1
+                continue
+            failed = []
+            try:
+                data = extract_people_info_download_image(
+                    listing_url(page), f'{save_path}/images', state, revisit, failed)
+            except Exception as e:
+                print(f"Error while crawling listing page {page}: {e!r}")
+                page += 1
+                continue
+            sink.write(data)
+            METRICS.inc('records_total', len(data))
+            # the records must be on disk before the page is checkpointed
+            sink.flush()
+            for person in data:
+                state.mark_seen(person['id'], person['URL'])
+            # a page with failed people is crawled again by the next run
+            if failed:
+                print(f"\n==>Page {page}: {len(failed)} people failed, it is not checkpointed")
+            else:
+                state.mark_page_done(page)
+            print("\n==>JSON file with page {} scrapped data is successfully scraped in directory".format(page))
+            page += 1
+            print("="*70)
+    finally:
+        set_rate_limiter(previous_limiter)
+        sink.close()
+        state.close()
+    if export:
+        export_json(f"{save_path}/missing_people.jsonl", f"{save_path}/missing_people.json")
     print("\n==>All images are scrapped and downloaded successfully in directory: {}".format(save_path))
     print("\n==>JSON file with all scrapped data is successfully downloaded in directory")
+    METRICS.report(f"{save_path}/metrics.prom")
 
 
-# function to add to JSON
+# function to add to JSON Lines
 def write_json(new_data, filename):
-    with open(filename, 'a+') as file:
-        # First we load existing data into a dict.
-        file_data = json.load(file)
-        # Join new_data with file_data inside emp_details
-        for i in new_data:
-            file_data.append(i)
-        # Sets file's current position at offset.
-        file.seek(0)
-        # convert back to json.
-        json.dump(file_data, file, indent=4, ensure_ascii=False)
+    with JsonlSink(filename) as sink:
+        sink.write(new_data)
 
 
 if __name__ == '__main__':
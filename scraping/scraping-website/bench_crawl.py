@@ -0,0 +1,45 @@
+"""
+Benchmark the async crawl engine offline, against the local stand-in server
+replaying an archive recorded with http_replay.
+
+Usage: python bench_crawl.py archive.db [number_of_pages] [concurrency ...]
+"""
+import sys
+import shutil
+import tempfile
+import threading
+from time import time
+
+from MafQudScrape import set_base_url
+from http_replay import make_server
+from crawl_async import crawl_missing_people_async
+from crawl_pipeline import crawl_missing_people_pipeline
+
+ENGINES = {'async': crawl_missing_people_async, 'pipeline': crawl_missing_people_pipeline}
+
+
+def bench(archive_path, number_of_pages, concurrency, engine='async', latency=0.05, error_rate=0.0):
+    server = make_server(archive_path, latency=latency, error_rate=error_rate, seed=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    set_base_url(f"http://127.0.0.1:{server.server_address[1]}")
+    save_path = tempfile.mkdtemp()
+    try:
+        t0 = time()
+        total = ENGINES[engine](save_path, number_of_pages, concurrency=concurrency,
+                                per_host=concurrency, delay=0.0, rate_limiter=False)
+        return total, time() - t0
+    finally:
+        server.shutdown()
+        server.server_close()
+        set_base_url()
+        shutil.rmtree(save_path)
+
+
+if __name__ == '__main__':
+    archive_path = sys.argv[1]
+    number_of_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    levels = [int(c) for c in sys.argv[3:]] or [1, 4, 16]
+    results = [(engine, c, *bench(archive_path, number_of_pages, c, engine)) for engine in ENGINES for c in levels]
+    print(f"{'engine':<9} {'concurrency':>11} {'people':>7} {'seconds':>8} {'people/sec':>10}")
+    for engine, concurrency, total, seconds in results:
+        print(f"{engine:<9} {concurrency:>11} {total:>7} {seconds:8.2f} {total / seconds:10.2f}")
@@ -0,0 +1,68 @@
+"""
+Benchmark of the government detection: the previous loop of str.find over the
+names against the Aho-Corasick matchers, on texts built from every record of
+the dataset, and how often the two disagree.
+
+Usage: python bench_gov_matcher.py [dataset json] [repeats]
+"""
+import sys
+import json
+from time import perf_counter
+
+from MafQudScrape import find_gov
+from arabic_content import GOVS_MAPPING_V2, EGYPT_GOVS
+from gov_matcher import WEBSITE_GOV_MATCHER, FB_GOV_MATCHER
+
+DATASET = '../../analysis/atfal_missing_people.json'
+
+
+def loop_find_gov(content):
+    # find_gov before the matcher: the first name of the dict found wins
+    for gov in GOVS_MAPPING_V2.keys():
+        if content.find(gov) >= 0:
+            return gov, GOVS_MAPPING_V2[gov]
+    return 'مفقود', 'Null'
+
+
+def loop_find_fb(content):
+    # the government loop of scrape_page, on the raw text: the spellings that
+    # are only found once normalized count in the differ column
+    for gov in EGYPT_GOVS:
+        if content.find(gov) >= 0:
+            return gov
+    return 'مفقود'
+
+
+def load_texts(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    # the person page text holds the name, the government and the date
+    return [f"الاسم: {person['name_arabic']} محافظة: {person['government_arabic']} "
+            f"تاريخ الفقد: {person['missing_date']} السن: {person['current_age']}" for person in data]
+
+
+def bench(func, texts, repeats):
+    t0 = perf_counter()
+    for _ in range(repeats):
+        results = [func(text) for text in texts]
+    return results, (perf_counter() - t0) / repeats
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DATASET
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    texts = load_texts(path)
+    print(f"{len(texts)} texts, {repeats} repeats")
+    print(f"{'method':<22} {'ms/batch':>9} {'us/text':>8} {'differ':>7}")
+    for name, loop, matcher in (('website', loop_find_gov, find_gov),
+                                ('facebook', loop_find_fb, lambda text: (FB_GOV_MATCHER.find(text) or ('مفقود',))[0])):
+        expected, elapsed = bench(loop, texts, repeats)
+        print(f"{name + ' loop':<22} {1000 * elapsed:9.2f} {1e6 * elapsed / len(texts):8.2f} {'':>7}")
+        results, elapsed = bench(matcher, texts, repeats)
+        differ = sum(a != b for a, b in zip(expected, results))
+        print(f"{name + ' matcher':<22} {1000 * elapsed:9.2f} {1e6 * elapsed / len(texts):8.2f} {differ:>7}")
+    t0 = perf_counter()
+    for _ in range(repeats):
+        WEBSITE_GOV_MATCHER.find_many(texts)
+    elapsed = (perf_counter() - t0) / repeats
+    print(f"{'website find_many':<22} {1000 * elapsed:9.2f} {1e6 * elapsed / len(texts):8.2f} {'':>7}")
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the listing and person page parsing: per-page parse latency
+and peak memory of every parser backend, with and without targeted parsing.
+
+Usage: python bench_parse.py <directory of saved .html pages> [repeats]
+"""
+import os
+import sys
+import io
+import tracemalloc
+from time import perf_counter
+from contextlib import redirect_stdout
+
+from MafQudScrape import configure_parser, parse_people_url, parse_people_info
+
+PARSERS = ['html.parser', 'lxml']
+
+
+def load_pages(directory):
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.html'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                content = f.read()
+            kind = 'listing' if b'modal_persons_missing' in content else 'person'
+            pages.append((kind, content))
+    return pages
+
+
+def parse(kind, content):
+    if kind == 'listing':
+        return parse_people_url(content)
+    return parse_people_info({'id': 0, 'URL': ''}, content)
+
+
+def bench(pages, repeats):
+    latency = {}
+    memory = {}
+    # parse_people_info prints the name of every person
+    with redirect_stdout(io.StringIO()):
+        for kind, content in pages:
+            t0 = perf_counter()
+            for _ in range(repeats):
+                parse(kind, content)
+            latency.setdefault(kind, []).append((perf_counter() - t0) / repeats)
+
+            tracemalloc.start()
+            parse(kind, content)
+            memory.setdefault(kind, []).append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return latency, memory
+
+
+if __name__ == '__main__':
+    pages = load_pages(sys.argv[1])
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"{len(pages)} pages, {repeats} repeats")
+    print(f"{'parser':<12} {'targeted':<9} {'page':<8} {'ms/page':>9} {'peak KiB':>9}")
+    for parser in PARSERS:
+        for targeted in (False, True):
+            try:
+                configure_parser(parser, targeted)
+                latency, memory = bench(pages, repeats)
+            except Exception as e:
+                # e.g. lxml is not installed
+                print(f"{parser:<12} {str(targeted):<9} skipped: {e!r}")
+                continue
+            for kind in sorted(latency):
+                ms = 1000 * sum(latency[kind]) / len(latency[kind])
+                kib = sum(memory[kind]) / len(memory[kind]) / 1024
+                print(f"{parser:<12} {str(targeted):<9} {kind:<8} {ms:9.3f} {kib:9.1f}")
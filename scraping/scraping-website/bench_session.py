@@ -0,0 +1,66 @@
+"""
+Benchmark the shared pooled session against a new Session per request
+(the old session_request) on a local HTTP stand-in of the website.
+
+Usage: python bench_session.py [number_of_requests]
+"""
+import sys
+import threading
+from time import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from urllib3.util import Retry
+from requests.adapters import HTTPAdapter
+
+from MafQudScrape import configure_session, session_request
+
+BODY = b'<html><body>' + b'x' * 20000 + b'</body></html>'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fresh_session_request(url, stream=False):
+    # the old session_request: a new Session, Retry and HTTPAdapter per call
+    session = requests.Session()
+    retry = Retry(connect=3, backoff_factor=5)
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    response = session.get(url, stream=stream)
+    return response
+
+
+def run(request, url, n):
+    t0 = time()
+    for _ in range(n):
+        request(url).content
+    return n / (time() - t0)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/ar/seen-him'
+
+    configure_session()
+    fresh = run(fresh_session_request, url, n)
+    pooled = run(session_request, url, n)
+    print(f"new session per request: {fresh:8.1f} requests/sec")
+    print(f"shared pooled session  : {pooled:8.1f} requests/sec")
+    print(f"speedup                : {pooled / fresh:8.2f}x")
+    server.shutdown()
@@ -0,0 +1,276 @@
+"""
+Asyncio crawl mode for the Atfal Mafkoda website.
+
+Listing pages, person pages and images are fetched in parallel, bounded by a
+global concurrency limit and a per-host politeness budget, instead of the
+fixed sleeps of extract_missing_people_info_to_json. The parsing logic of
+MafQudScrape (parse_people_url / parse_people_info) is reused as is.
+"""
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import time, monotonic
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from MafQudScrape import (listing_url, configure_session, set_rate_limiter, session_request, conditional_request,
+                          is_unchanged_person, parse_people_url, parse_people_info, JsonlSink, export_json)
+from image_downloader import plan_person_images, fetch_image, finalize_person_images
+from crawl_state import CrawlState
+from rate_control import AdaptiveLimiter
+from crawl_metrics import METRICS
+
+
+class HostBudget:
+    """
+    Politeness budget for each host: at most per_host requests in flight and
+    at least delay seconds between two request starts on the same host.
+
+    Parameters
+    ----------
+    per_host : int, optional
+        maximum number of concurrent requests per host. The default is 2.
+    delay : float, optional
+        minimum time in seconds between two requests on a host. The default is 1 sec.
+    """
+
+    def __init__(self, per_host=2, delay=1.0):
+        self.per_host = per_host
+        self.delay = delay
+        self._slots = {}
+        self._next_start = {}
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._slots:
+            self._slots[host] = asyncio.Semaphore(self.per_host)
+        async with self._slots[host]:
+            now = monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+class AsyncCrawler:
+    """
+    Crawl the website with asyncio, the blocking requests are run in worker threads.
+
+    Parameters
+    ----------
+    save_path : str, optional
+        the path (directory) the data will be saved in it. The default is 'dataset'.
+    concurrency : int, optional
+        maximum number of requests in flight over all hosts. The default is 8.
+    per_host : int, optional
+        maximum number of requests in flight per host. The default is 2.
+    delay : float, optional
+        minimum time in seconds between two requests on a host. The default is 1 sec.
+    mapping_method : str, optional
+        the method of mapping the arabic name to english name. The default is 'mapping'.
+    state : CrawlState, optional
+        the crawl state, to skip the completed pages and the unchanged people and images.
+    revisit : bool, optional
+        fetch again the people already scrapped even if their page can't be
+        revalidated with a conditional GET. The default is False.
+    """
+
+    def __init__(self, save_path="dataset", concurrency=8, per_host=2, delay=1.0, mapping_method="mapping",
+                 state=None, revisit=False):
+        self.save_path = save_path
+        self.images_path = f'{save_path}/images'
+        self.concurrency = concurrency
+        self.budget = HostBudget(per_host, delay)
+        self.mapping_method = mapping_method
+        self.state = state
+        self.revisit = revisit
+        self._limit = None
+
+    def install_executor(self):
+        """
+        Size the default executor of the running loop, where asyncio.to_thread
+        runs the requests, the parsing and the writes: its default of
+        min(32, cpus + 4) threads would silently cap the concurrency.
+        """
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(self.concurrency + 4))
+
+    @asynccontextmanager
+    async def request_slot(self, url):
+        # the semaphore must be created inside the running loop
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.concurrency)
+        async with self.budget.slot(url):
+            async with self._limit:
+                yield
+
+    async def fetch(self, url, revalidate=False):
+        async with self.request_slot(url):
+            if self.state is None:
+                response = await asyncio.to_thread(session_request, url)
+            else:
+                response = await asyncio.to_thread(conditional_request, url, self.state, False, revalidate)
+        # an error page left after the retries must not be parsed as an empty page
+        if response is not None:
+            response.raise_for_status()
+        return response
+
+    async def download(self, url, person_dir, on_disk):
+        async with self.request_slot(url):
+            return await asyncio.to_thread(fetch_image, url, person_dir, self.state, on_disk)
+
+    async def extract(self, base):
+        """
+        Fetch and parse the person page, None if it didn't change since the last crawl.
+        """
+        if is_unchanged_person(base, self.state, self.revisit):
+            return None
+        seen = self.state is not None and self.state.is_seen(base['id'])
+        response = await self.fetch(base['URL'], revalidate=seen)
+        if response is None:
+            return None
+        return await asyncio.to_thread(parse_people_info, base, response.content, self.mapping_method)
+
+    async def fetch_images(self, info):
+        """
+        Download the images of the person in parallel and fill imageRef / imageRefExtra.
+        """
+        person_dir, manifest, jobs = plan_person_images(info, self.images_path, self.state)
+        results = await asyncio.gather(*(self.download(url, person_dir, on_disk)
+                                         for url, on_disk in jobs), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # don't leave the temp files of the finished downloads behind
+            for result in results:
+                if not isinstance(result, BaseException) and result[1]:
+                    os.remove(result[1][0])
+            raise errors[0]
+        await asyncio.to_thread(finalize_person_images, info, person_dir, manifest, results, self.state)
+        return info
+
+    async def crawl_person(self, base):
+        info = await self.extract(base)
+        if info is None:
+            return None
+        return await self.fetch_images(info)
+
+    async def crawl_page(self, page):
+        """
+        Crawl the people of a listing page, the failed ones are logged and counted.
+        """
+        response = await self.fetch(listing_url(page))
+        people = parse_people_url(response.content)
+        results = await asyncio.gather(*(self.crawl_person(base) for base in people), return_exceptions=True)
+        infos = []
+        failed = 0
+        for base, result in zip(people, results):
+            if isinstance(result, BaseException):
+                print(f"Error while crawling person {base['id']}: {result!r}")
+                failed += 1
+            elif result is not None:
+                infos.append(result)
+        return page, infos, failed
+
+    async def crawl(self, number_of_pages=-1):
+        if number_of_pages == -1:
+            number_of_pages = 90
+        self.install_executor()
+        sink = JsonlSink(f"{self.save_path}/missing_people.jsonl")
+        completed = self.state.completed_pages() if self.state is not None else set()
+        pages = [self.crawl_page(page) for page in range(1, number_of_pages + 1)
+                 if page not in completed]
+        total = 0
+        try:
+            for done in asyncio.as_completed(pages):
+                try:
+                    page, data, failed = await done
+                except Exception as e:
+                    print(f"Error while crawling a listing page: {e!r}")
+                    continue
+                sink.write(data)
+                METRICS.inc('records_total', len(data))
+                if self.state is not None:
+                    # the records must be on disk before the page is checkpointed
+                    sink.flush()
+                    for person in data:
+                        self.state.mark_seen(person['id'], person['URL'])
+                    # a page with failed people is crawled again by the next run
+                    if not failed:
+                        self.state.mark_page_done(page)
+                if failed:
+                    print(f"\n==>Page {page}: {failed} people failed, it is not checkpointed")
+                total += len(data)
+                print("\n==>JSON file with page {} scrapped data is successfully scraped in directory".format(page))
+        finally:
+            sink.close()
+        return total
+
+
+def crawl_missing_people_async(save_path="dataset", number_of_pages=-1, concurrency=8, per_host=2, delay=1.0,
+                               mapping_method="mapping", state_path=None, resume=True, revisit=False, export=True,
+                               rate_limiter=None):
+    """
+    Async version of extract_missing_people_info_to_json: extract the information from all
+    pages (limited by number_of_pages), download the images and append them to
+    missing_people.jsonl (exported at the end to missing_people.json).
+    Parameters
+    ----------
+    save_path : str, optional
+        the path (directory) the data will be saved in it. The default is 'dataset'.
+    number_of_pages : int, optional
+        number of pages you want to scrape. The default is -1 (all the 90 pages).
+    concurrency : int, optional
+        maximum number of requests in flight. The default is 8.
+    per_host : int, optional
+        maximum number of requests in flight per host. The default is 2.
+    delay : float, optional
+        minimum time in seconds between two requests on a host. The default is 1 sec.
+    mapping_method : str, optional
+        the method of mapping the arabic name to english name. The default is 'mapping'.
+    state_path : str, optional
+        the path of the crawl state file. The default is save_path/crawl_state.db.
+    resume : bool, optional
+        skip the listing pages completed by a previous run. The default is True.
+    revisit : bool, optional
+        fetch again the people already scrapped even if their page can't be
+        revalidated with a conditional GET. The default is False.
+    export : bool, optional
+        export the JSON Lines file to a compact missing_people.json at the end.
+        The default is True.
+    rate_limiter : rate_control.AdaptiveLimiter, optional
+        the adaptive limiter shared by all the requests. The default is a new
+        AdaptiveLimiter(); pass False to only use the per-host budget.
+    Returns
+    -------
+    total : int
+        number of people scrapped.
+    """
+    t0 = time()
+    METRICS.reset()
+    # keep one pooled connection per request in flight
+    configure_session(pool_maxsize=max(concurrency, 10))
+    state = CrawlState(state_path or f"{save_path}/crawl_state.db")
+    if not resume:
+        # forget the completed pages, but keep the validators and image hashes
+        state.forget_pages()
+    crawler = AsyncCrawler(save_path, concurrency, per_host, delay, mapping_method, state, revisit)
+    if rate_limiter is None:
+        rate_limiter = AdaptiveLimiter()
+    previous_limiter = set_rate_limiter(rate_limiter or None)
+    try:
+        total = asyncio.run(crawler.crawl(number_of_pages))
+    finally:
+        set_rate_limiter(previous_limiter)
+        state.close()
+    if export:
+        export_json(f"{save_path}/missing_people.jsonl", f"{save_path}/missing_people.json")
+    print(f"\n==>{total} people are scrapped in {time() - t0:.1f}s into directory: {save_path}")
+    METRICS.report(f"{save_path}/metrics.prom")
+    return total
+
+
+if __name__ == '__main__':
+    # You may need to change the SAVE_DIR to another directory
+    SAVE_DIR = r"data_not_ready"
+    crawl_missing_people_async(SAVE_DIR)
@@ -0,0 +1,179 @@
+"""
+Instrumentation of the crawls: latency histograms per stage, bytes downloaded,
+retries, parse failures and records per second.
+
+Every module records into the process-wide METRICS registry. At the end of a
+run the crawls export it to a Prometheus text file and print a summary.
+"""
+import bisect
+import functools
+import threading
+from time import monotonic
+from contextlib import contextmanager
+
+# latency buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'request_seconds': 'Latency of the HTTP requests (headers received).',
+    'parse_seconds': 'Time to parse a page.',
+    'image_seconds': 'Time to download one image.',
+    'requests_total': 'HTTP responses by status code.',
+    'retries_total': 'Retried HTTP requests.',
+    'bytes_downloaded_total': 'Bytes downloaded.',
+    'parse_failures_total': 'Pages that failed to parse.',
+    'image_failures_total': 'Images that failed to download.',
+    'records_total': 'Records written to the output.',
+}
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate the q quantile as the upper bound of its bucket.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    Registry of counters and histograms, labelled by a stage and safe to share between threads.
+    """
+
+    def __init__(self, prefix='mafqud'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = monotonic()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, stage):
+        key = (name, stage)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, stage):
+        t0 = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, monotonic() - t0, stage)
+
+    def timed(self, name, stage, failures=None):
+        """
+        Decorator timing every call of the function into the name histogram,
+        and counting the exceptions into the failures counter if given.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, stage):
+                    try:
+                        return func(*args, **kwargs)
+                    except Exception:
+                        if failures is not None:
+                            self.inc(failures, stage=stage)
+                        raise
+            return wrapper
+        return decorator
+
+    def total(self, name):
+        with self._lock:
+            return sum(value for (counter, _), value in self.counters.items() if counter == name)
+
+    def export_prometheus(self, path):
+        """
+        Write the metrics in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        path : str
+            path of the .prom file.
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for name in sorted({name for (name, _), _ in histograms}):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {metric} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {metric} histogram')
+            for (other, stage), histogram in histograms:
+                if other != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+        for name in sorted({name for (name, _), _ in counters}):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {metric} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {metric} counter')
+            for (other, labels), value in counters:
+                if other != name:
+                    continue
+                label = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{metric}{{{label}}} {value}' if label else f'{metric} {value}')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def summary(self):
+        """
+        Return a human readable summary of the run.
+        """
+        elapsed = monotonic() - self.started
+        records = self.total('records_total')
+        lines = [f"{'stage':<24} {'count':>7} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8}"]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+        for (name, stage), h in histograms:
+            lines.append(f"{name + '/' + stage:<24} {h.count:>7} {1000 * h.sum / h.count:9.1f} "
+                         f"{1000 * h.quantile(0.5):8.0f} {1000 * h.quantile(0.95):8.0f}")
+        lines.append(f"requests: {self.total('requests_total')}, retries: {self.total('retries_total')}, "
+                     f"parse failures: {self.total('parse_failures_total')}, "
+                     f"image failures: {self.total('image_failures_total')}")
+        lines.append(f"downloaded: {self.total('bytes_downloaded_total') / 2 ** 20:.1f} MiB, "
+                     f"records: {records} in {elapsed:.1f}s ({records / elapsed if elapsed else 0:.2f} records/sec)")
+        return '\n'.join(lines)
+
+    def report(self, path=None):
+        """
+        Print the summary and export the metrics to path if given.
+        """
+        if path is not None:
+            self.export_prometheus(path)
+        print("\n" + self.summary())
+
+
+METRICS = Metrics()
@@ -0,0 +1,260 @@
+"""
+Staged producer/consumer crawl of the Atfal Mafkoda website.
+
+    listing discovery -> detail extraction -> image fetch -> record sink
+
+Every stage has its own number of workers and is connected to the next one by
+a bounded queue, so a slow stage applies backpressure to the previous ones
+instead of blocking everything: detail pages keep being fetched while images
+download, and the JSON Lines writes overlap with the network.
+"""
+import asyncio
+from time import time
+
+from MafQudScrape import (listing_url, configure_session, set_rate_limiter, parse_people_url, JsonlSink,
+                          export_json)
+from crawl_state import CrawlState
+from rate_control import AdaptiveLimiter
+from crawl_metrics import METRICS
+from crawl_async import AsyncCrawler
+
+# marks the end of a queue for one worker
+DONE = None
+
+
+class PipelineCrawler(AsyncCrawler):
+    """
+    Crawl the website with a staged pipeline, see AsyncCrawler for the request
+    budget and the crawl state.
+
+    Parameters
+    ----------
+    listing_workers : int, optional
+        number of listing discovery workers. The default is 2.
+    detail_workers : int, optional
+        number of person page workers. The default is 8.
+    image_workers : int, optional
+        number of image workers, each one downloads the images of one person. The default is 8.
+    queue_size : int, optional
+        capacity of the queues between the stages. The default is 64.
+    **kwargs :
+        the arguments of AsyncCrawler.
+    """
+
+    def __init__(self, listing_workers=2, detail_workers=8, image_workers=8, queue_size=64, **kwargs):
+        super().__init__(**kwargs)
+        self.listing_workers = listing_workers
+        self.detail_workers = detail_workers
+        self.image_workers = image_workers
+        self.queue_size = queue_size
+        self.total = 0
+
+    async def listing_stage(self, pages, details, records):
+        while True:
+            page = await pages.get()
+            if page is DONE:
+                return
+            try:
+                response = await self.fetch(listing_url(page))
+                people = parse_people_url(response.content)
+            except Exception as e:
+                print(f"Error while crawling listing page {page}: {e!r}")
+                continue
+            # tell the sink how many people to wait for before checkpointing the page
+            await records.put(('page', page, len(people)))
+            for base in people:
+                await details.put((page, base))
+
+    async def detail_stage(self, details, images, records):
+        while True:
+            item = await details.get()
+            if item is DONE:
+                return
+            page, base = item
+            try:
+                info = await self.extract(base)
+            except Exception as e:
+                print(f"Error while crawling person {base['id']}: {e!r}")
+                await records.put(('failed', page, None))
+                continue
+            if info is None:
+                await records.put(('person', page, None))
+            else:
+                await images.put((page, info))
+
+    async def image_stage(self, images, records):
+        while True:
+            item = await images.get()
+            if item is DONE:
+                return
+            page, info = item
+            try:
+                info = await self.fetch_images(info)
+            except Exception as e:
+                print(f"Error while downloading the images of person {info['id']}: {e!r}")
+                await records.put(('failed', page, None))
+                continue
+            await records.put(('person', page, info))
+
+    async def sink_stage(self, records, sink):
+        expected = {}
+        received = {}
+        failed = {}
+        data = {}
+        while True:
+            item = await records.get()
+            if item is DONE:
+                return
+            kind, page, value = item
+            if kind == 'page':
+                expected[page] = value
+            else:
+                received[page] = received.get(page, 0) + 1
+                if kind == 'failed':
+                    failed[page] = failed.get(page, 0) + 1
+                elif value is not None:
+                    data.setdefault(page, []).append(value)
+            if page in expected and received.get(page, 0) == expected[page]:
+                await asyncio.to_thread(self.write_page, sink, page, data.pop(page, []), failed.pop(page, 0))
+                del expected[page]
+                received.pop(page, None)
+
+    def write_page(self, sink, page, data, failed=0):
+        sink.write(data)
+        METRICS.inc('records_total', len(data))
+        if self.state is not None:
+            # the records must be on disk before the page is checkpointed
+            sink.flush()
+            for person in data:
+                self.state.mark_seen(person['id'], person['URL'])
+            # a page with failed people is crawled again by the next run
+            if not failed:
+                self.state.mark_page_done(page)
+        if failed:
+            print(f"\n==>Page {page}: {failed} people failed, it is not checkpointed")
+        self.total += len(data)
+        print("\n==>JSON file with page {} scrapped data is successfully scraped in directory".format(page))
+
+    async def crawl(self, number_of_pages=-1):
+        if number_of_pages == -1:
+            number_of_pages = 90
+        self.install_executor()
+        completed = self.state.completed_pages() if self.state is not None else set()
+        pages = asyncio.Queue()
+        details = asyncio.Queue(self.queue_size)
+        images = asyncio.Queue(self.queue_size)
+        records = asyncio.Queue(self.queue_size)
+        for page in range(1, number_of_pages + 1):
+            if page not in completed:
+                pages.put_nowait(page)
+
+        sink = JsonlSink(f"{self.save_path}/missing_people.jsonl")
+        listing = [asyncio.create_task(self.listing_stage(pages, details, records))
+                   for _ in range(self.listing_workers)]
+        detail = [asyncio.create_task(self.detail_stage(details, images, records))
+                  for _ in range(self.detail_workers)]
+        image = [asyncio.create_task(self.image_stage(images, records))
+                 for _ in range(self.image_workers)]
+        writer = asyncio.create_task(self.sink_stage(records, sink))
+
+        async def shutdown():
+            # shut the stages down in order, once the previous one is drained
+            for queue, workers in ((pages, listing), (details, detail), (images, image), (records, [writer])):
+                for _ in workers:
+                    await queue.put(DONE)
+                await asyncio.gather(*workers)
+
+        # a failed stage stops draining its queue and would block the others
+        # on a full one forever: stop everything on the first error
+        tasks = [asyncio.create_task(shutdown()), *listing, *detail, *image, writer]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            sink.close()
+        return self.total
+
+
+def crawl_missing_people_pipeline(save_path="dataset", number_of_pages=-1, listing_workers=2, detail_workers=8,
+                                  image_workers=8, queue_size=64, concurrency=8, per_host=2, delay=1.0,
+                                  mapping_method="mapping", state_path=None, resume=True, revisit=False,
+                                  export=True, rate_limiter=None):
+    """
+    Pipelined version of extract_missing_people_info_to_json: extract the information from
+    all pages (limited by number_of_pages), download the images and append them to
+    missing_people.jsonl (exported at the end to missing_people.json).
+    Parameters
+    ----------
+    save_path : str, optional
+        the path (directory) the data will be saved in it. The default is 'dataset'.
+    number_of_pages : int, optional
+        number of pages you want to scrape. The default is -1 (all the 90 pages).
+    listing_workers : int, optional
+        number of listing discovery workers. The default is 2.
+    detail_workers : int, optional
+        number of person page workers. The default is 8.
+    image_workers : int, optional
+        number of image workers. The default is 8.
+    queue_size : int, optional
+        capacity of the queues between the stages. The default is 64.
+    concurrency : int, optional
+        maximum number of requests in flight. The default is 8.
+    per_host : int, optional
+        maximum number of requests in flight per host. The default is 2.
+    delay : float, optional
+        minimum time in seconds between two requests on a host. The default is 1 sec.
+    mapping_method : str, optional
+        the method of mapping the arabic name to english name. The default is 'mapping'.
+    state_path : str, optional
+        the path of the crawl state file. The default is save_path/crawl_state.db.
+    resume : bool, optional
+        skip the listing pages completed by a previous run. The default is True.
+    revisit : bool, optional
+        fetch again the people already scrapped even if their page can't be
+        revalidated with a conditional GET. The default is False.
+    export : bool, optional
+        export the JSON Lines file to a compact missing_people.json at the end.
+        The default is True.
+    rate_limiter : rate_control.AdaptiveLimiter, optional
+        the adaptive limiter shared by all the requests. The default is a new
+        AdaptiveLimiter(); pass False to only use the per-host budget.
+    Returns
+    -------
+    total : int
+        number of people scrapped.
+    """
+    t0 = time()
+    METRICS.reset()
+    # keep one pooled connection per request in flight
+    configure_session(pool_maxsize=max(concurrency, 10))
+    state = CrawlState(state_path or f"{save_path}/crawl_state.db")
+    if not resume:
+        # forget the completed pages, but keep the validators and image hashes
+        state.forget_pages()
+    crawler = PipelineCrawler(listing_workers, detail_workers, image_workers, queue_size,
+                              save_path=save_path, concurrency=concurrency, per_host=per_host, delay=delay,
+                              mapping_method=mapping_method, state=state, revisit=revisit)
+    if rate_limiter is None:
+        rate_limiter = AdaptiveLimiter()
+    previous_limiter = set_rate_limiter(rate_limiter or None)
+    try:
+        total = asyncio.run(crawler.crawl(number_of_pages))
+    finally:
+        set_rate_limiter(previous_limiter)
+        state.close()
+    if export:
+        export_json(f"{save_path}/missing_people.jsonl", f"{save_path}/missing_people.json")
+    print(f"\n==>{total} people are scrapped in {time() - t0:.1f}s into directory: {save_path}")
+    METRICS.report(f"{save_path}/metrics.prom")
+    return total
+
+
+if __name__ == '__main__':
+    # You may need to change the SAVE_DIR to another directory
+    SAVE_DIR = r"data_not_ready"
+    crawl_missing_people_pipeline(SAVE_DIR)
@@ -0,0 +1,97 @@
+"""
+Persistent crawl state, so an interrupted or nightly crawl doesn't start from scratch.
+
+The state is a small sqlite database that records the completed listing pages,
+the ids of the people already scrapped, the ETag/Last-Modified validators of
+each URL (for conditional GETs) and the hash of each downloaded image.
+"""
+import os
+import sqlite3
+import threading
+from time import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, completed_at REAL);
+CREATE TABLE IF NOT EXISTS people (id INTEGER PRIMARY KEY, url TEXT, scraped_at REAL);
+CREATE TABLE IF NOT EXISTS validators (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT);
+CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, url TEXT, sha256 TEXT, size INTEGER);
+"""
+
+
+class CrawlState:
+    """
+    Crawl state stored in a sqlite file, safe to share between threads.
+
+    Parameters
+    ----------
+    path : str
+        path of the sqlite file, created if it doesn't exist.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def completed_pages(self):
+        return {row[0] for row in self._execute("SELECT page FROM pages")}
+
+    def last_completed_page(self):
+        rows = self._execute("SELECT MAX(page) FROM pages")
+        return rows[0][0] or 0
+
+    def mark_page_done(self, page):
+        self._execute("INSERT OR REPLACE INTO pages VALUES (?, ?)", (page, time()))
+
+    def forget_pages(self):
+        self._execute("DELETE FROM pages")
+
+    def is_seen(self, person_id):
+        return bool(self._execute("SELECT 1 FROM people WHERE id = ?", (person_id,)))
+
+    def mark_seen(self, person_id, url):
+        self._execute("INSERT OR REPLACE INTO people VALUES (?, ?, ?)", (person_id, url, time()))
+
+    def conditional_headers(self, url):
+        """
+        Return the If-None-Match / If-Modified-Since headers for url ({} if unknown).
+        """
+        rows = self._execute("SELECT etag, last_modified FROM validators WHERE url = ?", (url,))
+        headers = {}
+        if rows:
+            etag, last_modified = rows[0]
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def store_validators(self, url, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self._execute("INSERT OR REPLACE INTO validators VALUES (?, ?, ?)",
+                          (url, etag, last_modified))
+
+    def image(self, path):
+        """
+        Return (sha256, size) of the image recorded at path, or None.
+        """
+        rows = self._execute("SELECT sha256, size FROM images WHERE path = ?", (path,))
+        return rows[0] if rows else None
+
+    def store_image(self, path, url, sha256, size):
+        self._execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)", (path, url, sha256, size))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
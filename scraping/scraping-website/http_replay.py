@@ -0,0 +1,294 @@
+"""
+Offline HTTP record/replay for the website scraper.
+
+The responses (HTML pages and image bytes) fetched through session_request are
+recorded into a compact sqlite archive, text bodies are zlib compressed. The
+archive can then be replayed in process (no network at all) or served by a
+local stand-in server with configurable latency and error injection, so the
+crawl can be benchmarked and regression tested without atfalmafkoda.com.
+
+Usage:
+    python http_replay.py record archive.db [number_of_pages]
+    python http_replay.py serve archive.db [--port 8000] [--latency 0.05] [--error-rate 0.01]
+"""
+import io
+import sys
+import json
+import zlib
+import random
+import sqlite3
+import argparse
+import threading
+from time import sleep
+from functools import partial
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+
+import MafQudScrape
+import http_session
+
+# headers that describe the transfer of the original body, not the stored one
+HOP_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection', 'keep-alive'}
+
+
+def _path(url):
+    parts = urlsplit(url)
+    return parts.path + ('?' + parts.query if parts.query else '')
+
+
+class HttpArchive:
+    """
+    Archive of HTTP responses stored in a sqlite file, safe to share between threads.
+
+    Parameters
+    ----------
+    path : str
+        path of the archive file, created if it doesn't exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, path TEXT, status INTEGER,"
+                         " headers TEXT, compressed INTEGER, body BLOB)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_path ON responses (path)")
+
+    def put(self, url, status, headers, body):
+        headers = {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS}
+        # images are already compressed
+        compressed = not headers.get('Content-Type', '').startswith('image/')
+        if compressed:
+            body = zlib.compress(body, 6)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (url, _path(url), status, json.dumps(headers), int(compressed), body))
+
+    def _load(self, column, value):
+        with self._lock:
+            row = self._db.execute(f"SELECT status, headers, compressed, body FROM responses WHERE {column} = ?",
+                                   (value,)).fetchone()
+        if row is None:
+            return None
+        status, headers, compressed, body = row
+        return status, json.loads(headers), zlib.decompress(body) if compressed else bytes(body)
+
+    def get(self, url):
+        """
+        Return (status, headers, body) recorded for url, or None.
+        """
+        return self._load('url', url)
+
+    def get_path(self, path):
+        """
+        Return (status, headers, body) recorded for the path (and query) of any host, or None.
+        """
+        return self._load('path', path)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _raw_response(status, headers, body):
+    headers = dict(headers)
+    headers['Content-Length'] = str(len(body))
+    return HTTPResponse(body=io.BytesIO(body), headers=headers, status=status,
+                        preload_content=False, decode_content=False)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that records every response into an HttpArchive.
+    """
+
+    def __init__(self, archive, **kwargs):
+        self.archive = archive
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        body = response.content
+        # a 304 has no body, keep the recorded one
+        if response.status_code != 304:
+            self.archive.put(request.url, response.status_code, response.headers, body)
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS}
+        # the body is consumed, give streaming callers a fresh raw body to read
+        replayed = self.build_response(request, _raw_response(response.status_code, headers, body))
+        replayed.history = response.history
+        return replayed
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Transport adapter that answers every request from an HttpArchive, 404 if it wasn't recorded.
+    """
+
+    def __init__(self, archive, **kwargs):
+        # the pool and retry arguments of HTTPAdapter are meaningless offline
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, stream=False, **kwargs):
+        recorded = self.archive.get(request.url)
+        if recorded is None:
+            recorded = (404, {'Content-Type': 'text/plain'}, b'not recorded')
+        status, headers, body = recorded
+        etag = headers.get('ETag')
+        if etag and request.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+        response = HTTPAdapter.build_response(self, request, _raw_response(status, headers, body))
+        if not stream:
+            response.content
+        return response
+
+    def close(self):
+        pass
+
+
+def record(archive_path):
+    """
+    Record every response of session_request into the archive from now on.
+
+    Returns
+    -------
+    archive : HttpArchive
+        the archive being recorded.
+    """
+    archive = HttpArchive(archive_path)
+    http_session.set_adapter_factory(partial(RecordingAdapter, archive))
+    return archive
+
+
+def replay(archive_path):
+    """
+    Answer every request of session_request from the archive, without network.
+
+    Returns
+    -------
+    archive : HttpArchive
+        the archive being replayed.
+    """
+    archive = HttpArchive(archive_path)
+    http_session.set_adapter_factory(partial(ReplayAdapter, archive))
+    return archive
+
+
+def stop():
+    """
+    Go back to the real network transport.
+    """
+    http_session.set_adapter_factory(HTTPAdapter)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients dropping kept-alive connections are expected, not errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_server(archive_path, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                error_status=503, retry_after=None, seed=None):
+    """
+    Build a local stand-in server of the website replaying the archive.
+    Use MafQudScrape.set_base_url(f"http://{host}:{server.server_address[1]}") to crawl it.
+
+    Parameters
+    ----------
+    archive_path : str
+        path of the archive to replay.
+    host : str, optional
+        the interface to listen on. The default is '127.0.0.1'.
+    port : int, optional
+        the port to listen on. The default is 0 (any free port).
+    latency : float, optional
+        seconds to wait before answering each request. The default is 0.
+    jitter : float, optional
+        random extra latency, uniform in [0, jitter] seconds. The default is 0.
+    error_rate : float, optional
+        fraction of the requests answered with error_status. The default is 0.
+    error_status : int, optional
+        the status of the injected errors. The default is 503.
+    retry_after : int, optional
+        Retry-After header (seconds) sent with the injected errors. The default is None.
+    seed : int, optional
+        seed of the latency and error randomness, for reproducible runs.
+    Returns
+    -------
+    server : ThreadingHTTPServer
+        the server, call serve_forever() to start it.
+    """
+    archive = HttpArchive(archive_path)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with rng_lock:
+                delay = latency + rng.uniform(0, jitter)
+                failed = rng.random() < error_rate
+            if delay:
+                sleep(delay)
+            if failed:
+                headers = {'Content-Type': 'text/plain'}
+                if retry_after is not None:
+                    headers['Retry-After'] = str(retry_after)
+                return self.reply(error_status, headers, b'injected error')
+            recorded = archive.get_path(self.path)
+            if recorded is None:
+                return self.reply(404, {'Content-Type': 'text/plain'}, b'not recorded')
+            status, headers, body = recorded
+            etag = headers.get('ETag')
+            if etag and self.headers.get('If-None-Match') == etag:
+                return self.reply(304, headers, b'')
+            self.reply(status, headers, body)
+
+        def reply(self, status, headers, body):
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInServer((host, port), StandInHandler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['record', 'serve'])
+    parser.add_argument('archive')
+    parser.add_argument('pages', nargs='?', type=int, default=1, help='number of pages to record')
+    parser.add_argument('--save-path', default='recorded')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        archive = record(args.archive)
+        MafQudScrape.extract_missing_people_info_to_json(args.save_path, args.pages)
+        print(f"{len(archive)} responses recorded in {args.archive}")
+    else:
+        server = make_server(args.archive, port=args.port, latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate, error_status=args.error_status)
+        print(f"Serving {args.archive} on http://127.0.0.1:{server.server_address[1]}")
+        server.serve_forever()
@@ -0,0 +1,178 @@
+"""
+The HTTP session shared by the scrapers: one pooled requests session with
+its retry policy, the transport adapter (see http_replay) and the rate
+limiter pacing every request. MafQudScrape and image_downloader both import
+it, so there is one session and one limiter per process whatever module runs
+as __main__.
+"""
+import threading
+from time import monotonic
+
+import requests
+from urllib3.util import Retry
+from requests.adapters import HTTPAdapter
+
+from crawl_metrics import METRICS
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+_SESSION_CONFIG = {'pool_connections': 10, 'pool_maxsize': 10, 'connect': 3, 'backoff_factor': 5}
+# builds the transport adapter of the session, see set_adapter_factory
+_ADAPTER_FACTORY = HTTPAdapter
+# paces every request of session_request when set, see set_rate_limiter
+_RATE_LIMITER = None
+
+
+def _build_session(pool_connections, pool_maxsize, connect, backoff_factor):
+    session = requests.Session()
+    retry = Retry(connect=connect, backoff_factor=backoff_factor)
+    adapter = _ADAPTER_FACTORY(pool_connections=pool_connections,
+                               pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def configure_session(pool_connections=10, pool_maxsize=10, connect=3, backoff_factor=5):
+    """
+    (Re)build the process-wide session shared by every request, with keep-alive
+    connection pooling and the retry/backoff policy configured once.
+
+    Parameters
+    ----------
+    pool_connections : int, optional
+        number of hosts to keep a connection pool for. The default is 10.
+    pool_maxsize : int, optional
+        maximum number of kept-alive connections per host, should be at least
+        the number of concurrent requests. The default is 10.
+    connect : int, optional
+        number of retries on connection errors. The default is 3.
+    backoff_factor : float, optional
+        backoff factor between the retries. The default is 5.
+    Returns
+    -------
+    session : requests.Session
+        the new shared session.
+    """
+    global _SESSION
+    _SESSION_CONFIG.update(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                           connect=connect, backoff_factor=backoff_factor)
+    session = _build_session(pool_connections, pool_maxsize, connect, backoff_factor)
+    with _SESSION_LOCK:
+        old, _SESSION = _SESSION, session
+    if old is not None:
+        old.close()
+    return session
+
+
+def get_session():
+    """
+    Return the process-wide session, building it with the defaults on first use.
+    """
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                _SESSION = _build_session(**_SESSION_CONFIG)
+    return _SESSION
+
+
+def set_adapter_factory(factory=HTTPAdapter):
+    """
+    Replace the transport under session_request (e.g. the record/replay
+    adapters of http_replay) and rebuild the shared session with it.
+
+    Parameters
+    ----------
+    factory : callable, optional
+        called with pool_connections, pool_maxsize and max_retries keywords
+        to build the adapter. The default is requests HTTPAdapter.
+    Returns
+    -------
+    session : requests.Session
+        the new shared session.
+    """
+    global _ADAPTER_FACTORY
+    _ADAPTER_FACTORY = factory
+    return configure_session(**_SESSION_CONFIG)
+
+
+def set_rate_limiter(limiter=None):
+    """
+    Pace every request of session_request with the limiter (shared by all the
+    threads and stages), None to stop pacing.
+
+    Parameters
+    ----------
+    limiter : rate_control.AdaptiveLimiter, optional
+        the limiter. The default is None.
+    Returns
+    -------
+    previous : rate_control.AdaptiveLimiter
+        the limiter that was set before.
+    """
+    global _RATE_LIMITER
+    previous, _RATE_LIMITER = _RATE_LIMITER, limiter
+    return previous
+
+
+def _timed_get(url, stream, headers):
+    t0 = monotonic()
+    response = get_session().get(url, stream=stream, headers=headers)
+    latency = monotonic() - t0
+    # streamed requests are the images, their bytes are counted while downloading
+    stage = 'image' if stream else 'page'
+    METRICS.observe('request_seconds', latency, stage)
+    METRICS.inc('requests_total', status=response.status_code)
+    retries = getattr(response.raw, 'retries', None)
+    if retries is not None and retries.history:
+        METRICS.inc('retries_total', len(retries.history))
+    if not stream:
+        METRICS.inc('bytes_downloaded_total', len(response.content), stage=stage)
+    return response, latency
+
+
+def session_request(url, stream=False, headers=None):
+    limiter = _RATE_LIMITER
+    if limiter is None:
+        response, _ = _timed_get(url, stream, headers)
+        return response
+    for attempt in range(limiter.max_retries + 1):
+        limiter.wait()
+        response, latency = _timed_get(url, stream, headers)
+        limiter.record(latency, response.status_code, response.headers.get('Retry-After'))
+        if not limiter.should_retry(response.status_code) or attempt == limiter.max_retries:
+            return response
+        METRICS.inc('retries_total')
+        response.close()
+
+
+def conditional_request(url, state, stream=False, revalidate=False):
+    """
+    Request the url and record its ETag/Last-Modified validators in the crawl state.
+
+    Parameters
+    ----------
+    url : str
+        the url to be requested.
+    state : CrawlState
+        the crawl state holding the validators.
+    stream : bool, optional
+        stream the content of the response. The default is False.
+    revalidate : bool, optional
+        send the stored validators (conditional GET), only when the content
+        of the url is already saved. The default is False.
+    Returns
+    -------
+    response : requests.Response or None
+        the response, None if the content is not modified since the last crawl.
+    """
+    headers = state.conditional_headers(url) if revalidate else None
+    response = session_request(url, stream=stream, headers=headers)
+    if response.status_code == 304:
+        response.close()
+        return None
+    # the validators of an error page would revalidate it as the content
+    if response.ok:
+        state.store_validators(url, response)
+    return response
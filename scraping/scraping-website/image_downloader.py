@@ -0,0 +1,295 @@
+"""
+Parallel image download for the people of the Atfal Mafkoda website.
+
+Every image is streamed into a temp file and atomically renamed when complete.
+Duplicated images are detected by the sha256 of their content, and each person
+folder has a manifest.json that records the hash, size and source URLs of every
+image, so a re-run only downloads the images it doesn't have.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from http_session import session_request, conditional_request
+from crawl_metrics import METRICS
+
+MANIFEST = 'manifest.json'
+# one lock per person folder, shared by the people of the same name
+_FOLDER_LOCKS = {}
+_FOLDER_LOCKS_LOCK = threading.Lock()
+
+
+def load_manifest(person_dir):
+    """
+    Load the manifest of the person folder.
+
+    Parameters
+    ----------
+    person_dir : str
+        the folder of the person images.
+    Returns
+    -------
+    manifest : list
+        list of {"file", "sha256", "size", "urls"} entries, one per unique image.
+    """
+    try:
+        with open(os.path.join(person_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def save_manifest(person_dir, manifest):
+    tmp_path = os.path.join(person_dir, MANIFEST + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(person_dir, MANIFEST))
+
+
+@METRICS.timed('image_seconds', 'image')
+def fetch_to_temp(imageURL, directory, state=None, revalidate=False):
+    """
+    Stream the image into a temp file in directory while hashing it.
+
+    Parameters
+    ----------
+    imageURL : str
+        the url of the image.
+    directory : str
+        the folder of the temp file (the same as the final file, for an atomic rename).
+    state : CrawlState, optional
+        the crawl state holding the ETag/Last-Modified validators.
+    revalidate : bool, optional
+        send a conditional GET, the image is already on disk. The default is False.
+    Returns
+    -------
+    result : tuple or None
+        (temp path, sha256, size), None if the image is not modified.
+    """
+    if state is None:
+        r = session_request(imageURL, stream=True)
+    else:
+        r = conditional_request(imageURL, state, stream=True, revalidate=revalidate)
+        if r is None:
+            return None
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        # closing the response hands the connection back to the shared pool
+        with r, os.fdopen(fd, 'wb') as f:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            for chunk in iter(lambda: r.raw.read(64 * 1024), b''):
+                sha256.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    METRICS.inc('bytes_downloaded_total', size, stage='image')
+    return tmp_path, sha256.hexdigest(), size
+
+
+def file_prefix(id):
+    """
+    Prefix of the image files of a person: the id padded to 4 digits and '_'.
+    """
+    return (4 - len(str(id))) * '0' + str(id) + '_'
+
+
+def plan_person_images(base, save_path, state=None):
+    """
+    Create the person folder and decide which image urls need to be downloaded.
+
+    Parameters
+    ----------
+    base : dict
+        the information data about the person.
+    save_path : str
+        the path (directory) the images will be saved in it.
+    state : CrawlState, optional
+        the crawl state, to revalidate the images already on disk.
+    Returns
+    -------
+    person_dir : str
+        the folder of the person images.
+    manifest : list
+        the manifest of the previous downloads.
+    jobs : list
+        list of (url, on_disk) tuples, on_disk images are only revalidated.
+    """
+    person_dir = f"{save_path}/{base['Name_Arabic']}"
+    os.makedirs(person_dir, exist_ok=True)
+    manifest = load_manifest(person_dir)
+    # the folder may hold the images of other people of the same name
+    imgName = file_prefix(base['id'])
+    known = {url: entry for entry in manifest if entry['file'].startswith(imgName) for url in entry['urls']}
+    jobs = []
+    # the same url can be listed more than once on the page
+    for url in dict.fromkeys(base['image']):
+        entry = known.get(url)
+        on_disk = entry is not None and os.path.isfile(os.path.join(person_dir, entry['file'])) \
+            and os.path.getsize(os.path.join(person_dir, entry['file'])) == entry['size']
+        jobs.append((url, on_disk))
+    return person_dir, manifest, jobs
+
+
+def fetch_image(url, person_dir, state=None, on_disk=False):
+    """
+    Download one planned image, on_disk images are skipped or revalidated.
+    A failed download is logged and counted, it doesn't fail the person.
+
+    Returns
+    -------
+    result : tuple
+        (url, (temp path, sha256, size) or None if the file on disk is kept,
+        False if the image failed and there is no file on disk).
+    """
+    if on_disk and (state is None or not state.conditional_headers(url)):
+        return url, None
+    try:
+        return url, fetch_to_temp(url, person_dir, state, revalidate=on_disk)
+    except Exception as e:
+        print(f"Error while downloading the image {url}: {e!r}")
+        METRICS.inc('image_failures_total')
+        return url, None if on_disk else False
+
+
+def _folder_lock(person_dir):
+    with _FOLDER_LOCKS_LOCK:
+        return _FOLDER_LOCKS.setdefault(os.path.normpath(person_dir), threading.Lock())
+
+
+def finalize_person_images(base, person_dir, manifest, results, state=None):
+    """
+    Rename the downloaded temp files to their final names, drop the duplicated
+    content and write the manifest. Fills imageRef and imageRefExtra of base.
+    The people of the same name share the folder: only the entries and files
+    of this id (named by its prefix) are replaced, the files of this id no url
+    points to anymore are deleted, and the folder is finalized by one person
+    at a time.
+
+    Parameters
+    ----------
+    base : dict
+        the information data about the person.
+    person_dir : str
+        the folder of the person images.
+    manifest : list
+        the manifest of the previous downloads, read again under the folder
+        lock as another person may have changed it since.
+    results : list
+        list of (url, (temp path, sha256, size), None or False) in the order of
+        the page, see fetch_image.
+    state : CrawlState, optional
+        the crawl state, to record the hash of the new images.
+    Returns
+    -------
+    manifest : list
+        the new manifest entries of the person.
+    """
+    imgName = file_prefix(base['id'])
+    with _folder_lock(person_dir):
+        manifest = load_manifest(person_dir)
+        own = [entry for entry in manifest if entry['file'].startswith(imgName)]
+        others = [entry for entry in manifest if not entry['file'].startswith(imgName)]
+        known = {url: entry for entry in own for url in entry['urls']}
+        by_hash = {entry['sha256']: entry for entry in own}
+        used = {entry['file'] for entry in manifest}
+        new_manifest = []
+        by_new_hash = {}
+
+        for url, result in results:
+            if result is False:
+                # the failed images are left out
+                continue
+            if result is None:
+                sha256, size = known[url]['sha256'], known[url]['size']
+                tmp_path = None
+            else:
+                tmp_path, sha256, size = result
+            if sha256 in by_new_hash:
+                # same content under another url
+                entry = by_new_hash[sha256]
+                if url not in entry['urls']:
+                    entry['urls'].append(url)
+                if tmp_path:
+                    os.remove(tmp_path)
+                continue
+            if sha256 in by_hash:
+                # keep the name of the file that already holds this content
+                fileName = by_hash[sha256]['file']
+            else:
+                i = 0
+                while imgName + str(i) + '.jpg' in used:
+                    i += 1
+                fileName = imgName + str(i) + '.jpg'
+                used.add(fileName)
+            if tmp_path:
+                os.replace(tmp_path, os.path.join(person_dir, fileName))
+                if state is not None:
+                    state.store_image(os.path.join(person_dir, fileName), url, sha256, size)
+            entry = {"file": fileName, "sha256": sha256, "size": size, "urls": [url]}
+            by_new_hash[sha256] = entry
+            new_manifest.append(entry)
+
+        # an image removed from the page or replaced by new content
+        kept = {entry['file'] for entry in new_manifest}
+        for entry in own:
+            if entry['file'] not in kept and os.path.isfile(os.path.join(person_dir, entry['file'])):
+                os.remove(os.path.join(person_dir, entry['file']))
+        save_manifest(person_dir, others + new_manifest)
+
+    base['imageRefExtra'] = [entry['file'] for entry in new_manifest]
+    base['imageRef'] = base['imageRefExtra'][0] if new_manifest else imgName + '0' + '.jpg'
+    return new_manifest
+
+
+def download_person_images(base, save_path, state=None, workers=4, executor=None):
+    """
+    Download the images of the person in parallel, deduplicated by content.
+
+    Parameters
+    ----------
+    base : dict
+        the information data about the person.
+    save_path : str
+        the path (directory) the images will be saved in it.
+    state : CrawlState, optional
+        the crawl state, to skip the images that didn't change.
+    workers : int, optional
+        number of download threads. The default is 4.
+    executor : concurrent.futures.Executor, optional
+        a shared pool to run the downloads in, instead of a new one.
+    Returns
+    -------
+    manifest : list
+        the manifest of the person images.
+    """
+    person_dir, manifest, jobs = plan_person_images(base, save_path, state)
+    print(f"Downloading {len(jobs)} images of {base['Name_Arabic']} .....")
+
+    def run(pool):
+        futures = [pool.submit(fetch_image, url, person_dir, state, on_disk) for url, on_disk in jobs]
+        results = []
+        try:
+            for future in futures:
+                results.append(future.result())
+        except BaseException:
+            # don't leave the temp files of the finished downloads behind
+            for future in futures:
+                if not future.cancel() and future.exception() is None and future.result()[1]:
+                    os.remove(future.result()[1][0])
+            raise
+        return results
+
+    if executor is not None:
+        results = run(executor)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            results = run(pool)
+    return finalize_person_images(base, person_dir, manifest, results, state)
@@ -0,0 +1,122 @@
+"""
+Adaptive request rate for the website scraper.
+
+AdaptiveLimiter spaces the requests of session_request with an AIMD policy
+(additive increase, multiplicative decrease): the rate grows while the
+server answers fast, and is cut down on 429/5xx responses or when the
+response time rises above its usual level. Retry-After is honoured by pausing
+every request until the server is ready again. One limiter is shared by all
+the threads and pipeline stages of a crawl.
+"""
+import threading
+from time import monotonic, sleep
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (seconds or HTTP date) into seconds, None if invalid.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveLimiter:
+    """
+    AIMD rate limiter, safe to share between threads.
+
+    Parameters
+    ----------
+    rate : float, optional
+        initial rate in requests/sec. The default is 0.5.
+    min_rate : float, optional
+        the lowest rate. The default is 0.05 (one request every 20 sec).
+    max_rate : float, optional
+        the highest rate. The default is 5.
+    increase : float, optional
+        added to the rate after each fast successful response. The default is 0.05.
+    decrease : float, optional
+        the rate is multiplied by it on errors or slow responses. The default is 0.5.
+    target_latency : float, optional
+        responses slower than this (seconds) are considered slow. The default is 2 sec.
+    latency_factor : float, optional
+        responses slower than latency_factor times the average (and than latency_floor)
+        are considered slow. The default is 3.
+    latency_floor : float, optional
+        latency rises below this (seconds) are noise, not a struggling server. The default is 0.25 sec.
+    max_retries : int, optional
+        number of retries of the 429/5xx responses in session_request. The default is 3.
+    """
+
+    def __init__(self, rate=0.5, min_rate=0.05, max_rate=5.0, increase=0.05, decrease=0.5,
+                 target_latency=2.0, latency_factor=3.0, latency_floor=0.25, max_retries=3):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.latency_factor = latency_factor
+        self.latency_floor = latency_floor
+        self.max_retries = max_retries
+        self.average_latency = None
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Book the next request slot and return the seconds to wait before it.
+        """
+        with self._lock:
+            now = monotonic()
+            start = max(now, self._next_start, self._paused_until)
+            self._next_start = start + 1.0 / self.rate
+            return start - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            sleep(delay)
+
+    @staticmethod
+    def should_retry(status):
+        return status == 429 or status >= 500
+
+    def record(self, latency, status, retry_after=None):
+        """
+        Adapt the rate to one response.
+
+        Parameters
+        ----------
+        latency : float
+            the response time in seconds.
+        status : int
+            the status code of the response.
+        retry_after : str, optional
+            the Retry-After header of the response.
+        """
+        with self._lock:
+            rising = self.average_latency is not None and latency > self.latency_factor * self.average_latency
+            slow = latency > self.target_latency or (rising and latency > self.latency_floor)
+            if self.should_retry(status) or slow:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            if not self.should_retry(status):
+                # errors are often answered fast, keep them out of the average
+                self.average_latency = latency if self.average_latency is None \
+                    else 0.8 * self.average_latency + 0.2 * latency
+            pause = parse_retry_after(retry_after)
+            if pause:
+                self._paused_until = max(self._paused_until, monotonic() + pause)
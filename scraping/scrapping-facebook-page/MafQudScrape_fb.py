@@ -4,6 +4,16 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
 import time
+import os
+import sys
+
+# data-preprocessing is not an importable package name, so add it to the path
+sys.path.append(os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', 'data-preprocessing'))
+from gov_matcher import FB_GOV_MATCHER  # noqa: E402
+from transliterate import ARABIC_TRANSLITERATOR  # noqa: E402
+from translation_cache import get_cache  # noqa: E402
+from arabic_normalize import GOV_LOOKUP  # noqa: E402
 
 
 DRIVER_PATH = 'C:/Users/yosse/chromedriver.exe'
@@ -21,192 +31,6 @@ PAGE_MISSED = "https://www.facebook.com/media/set/?set=a.1544835639147391&type=3
 # SCRAPPED_GOVS_AR = []
 # SCRAPPED_IMAGES_LINKS = []
 
-# List of all Egyptian governments with nearly all the ways to write them
-EGYPT_GOVS = ['الأسكندرية', 'الاسكندرية', 'الاسكندرية', 'الإسكندرية', 'اسيوط', 'أسيوط', 'اسوان', 'أسوان', 'سوهاج', 'المنيا', 'منيا', 'الجيزة', 'الجيزة', 'الجيزه', 'جيزه', 'الجيزه', 'الاسكندريه',
-              'القاهرة', 'القاهره', 'قاهرة', 'قاهره', 'الدقهلية', 'الدقهليه', 'دقهلية', 'دقهليه',
-              'الأقصر', 'الاقصر', 'أقصر', 'اقصر', 'كفر الشيخ', 'مرسى مطروح', 'مطروح', 'قنا', 'السويس',
-              'دمياط', 'جنوب سيناء', 'البحيره', 'البحيرة', 'بحيرة', 'بحيره', 'الوادي الجديد', 'الوادى الجديد',
-              'المنوفية', 'المنوفيه', 'منوفيه', 'منوفية', 'القليوبية', 'القليوبيه', 'قليوبية',
-              'قليوبيه', 'الفيوم', 'فيوم', 'الغربية', 'الغربيه', 'غربية', 'غربيه', 'شمال سيناء', 'شمال سينا',
-              'جنوب سينا', 'الشرقية', 'الشرقيه', 'شرقية', 'شرقيه', 'بور سعيد', 'بني سويف', 'بنى سويف',
-              'البحر الأحمر', 'البحر الاحمر', 'بحر أحمر', 'بحر احمر', 'الاسماعيلية', 'الإسماعيلية', 'اسماعيلية',
-              'إسماعيلية', 'الاسماعيليه', 'الإسماعيليه', 'اسماعيليه', 'إسماعيليه', 'الاسماعليه', 'اسماعليه', 'إسماعلية',
-              'إسماعليه']
-
-ARABIC_MAPPING = {
-    'أ': 'a',
-    'ا': 'a',
-    'إ': 'e',
-    'ب': 'b',
-    'ت': 't',
-    'ث': 'th',
-    'ج': 'g',
-    'ح': 'h',
-    'خ': 'kh',
-    'د': 'd',
-    'ذ': 'th',
-    'ر': 'r',
-    'ز': 'z',
-    'س': 's',
-    'ش': 'sh',
-    'ص': 's',
-    'ض': 'd',
-    'ط': 't',
-    'ظ': 'th',
-    'ع': 'a',  # or : aa
-    'غ': 'gh',
-    'ف': 'f',
-    'ق': 'q',  # or : kh
-    'ك': 'k',
-    'ل': 'l',
-    'م': 'm',
-    'ن': 'n',
-    'ه': 'h',
-    'و': 'ou',
-    'ي': 'i',
-    'ى': 'a',
-    'ؤ': 'ou',
-    'ء': 'aa',
-    'ئ': 'e',
-    'ة': 'h',
-}
-
-GOVS_MAPPING = {
-    'اسيوط': 'Assiut',
-    'أسيوط': 'Assiut',
-    'الجيزه': 'Giza',
-    'الجيزة': 'Giza',
-    'جيزة': 'Giza',
-    'جيزه': 'Giza',
-    'أسوان': 'Aswan',
-    'اسوان': 'Aswan',
-    'الاسكندرية': 'Alexandria',
-    'الاسكندريه': 'Alexandria',
-    'الإسكندرية': 'Alexandria',
-    'الإسكندريه': 'Alexandria',
-    'الأسكندرية': 'Alexandria',
-    'الأسكندريه': 'Alexandria',
-    'اسكندرية': 'Alexandria',
-    'اسكندريه': 'Alexandria',
-    'أسكندرية': 'Alexandria',
-    'أسكندريه': 'Alexandria',
-    'إسكندرية': 'Alexandria',
-    'إسكندريه': 'Alexandria',
-    'المنيا': 'Minya',
-    'منيا': 'Minya',
-    'القاهرة': 'Cairo',
-    'القاهره': 'Cairo',
-    'قاهرة': 'Cairo',
-    'قاهره': 'Cairo',
-    'الدقهلية': 'Dakahlia',
-    'الدقهليه': 'Dakahlia',
-    'دقهلية': 'Dakahlia',
-    'دقهليه': 'Dakahlia',
-    'سوهاج': 'Sohag',
-    'الغربية': 'Gharbia',
-    'الغربيه': 'Gharbia',
-    'غربية': 'Gharbia',
-    'غربيه': 'Gharbia',
-    'البحيرة': 'Beheira',
-    'البحيره': 'Beheira',
-    'بحيرة': 'Beheira',
-    'بحيره': 'Beheira',
-    'القليوبية': 'Qualyubia',
-    'القليوبيه': 'Qualyubia',
-    'قليوبية': 'Qualyubia',
-    'قليوبيه': 'Qualyubia',
-    'الشرقية': 'Al-Sharqia',
-    'الشرقيه': 'Al-Sharqia',
-    'شرقية': 'Al-Sharqia',
-    'شرقيه': 'Al-Sharqia',
-    'المنوفية': 'Menofia',
-    'المنوفيه': 'Menofia',
-    'منوفية': 'Menofia',
-    'منوفيه': 'Menofia',
-    'بني سويف': 'Beni Suef',
-    'بنى سويف': 'Beni Suef',
-    'سويف': 'Beni Suef',
-    'قنا': 'Qena',
-    'بور سعيد': 'Port Said',
-    'بور': 'Port Said',
-    'سعيد': 'Port Said',
-    'البحر الأحمر': 'Red Sea',
-    'البحر الاحمر': 'Red Sea',
-    'بحر أحمر': 'Red Sea',
-    'بحر احمر': 'Red Sea',
-    'البحر': 'Red Sea',
-    'الأحمر': 'Red Sea',
-    'الاحمر': 'Red Sea',
-    'أحمر': 'Red Sea',
-    'احمر': 'Red Sea',
-    'دمياط': 'Damietta',
-    'الفيوم': 'Fayoum',
-    'فيوم': 'Fayoum',
-    'كفر الشيخ': 'Kafr el-Sheikh',
-    'كفر شيخ': 'Kafr el-Sheikh',
-    'كفر': 'Kafr el-Sheikh',
-    'شيخ': 'Kafr el-Sheikh',
-    'الشيخ': 'Kafr el-Sheikh',
-    'مرسى مطروح': 'Matrouh',
-    'مطروح': 'Matrouh',
-    'مرسى': 'Matrouh',
-    'المرسى': 'Matrouh',
-    'الوادي الجديد': 'New Valley',
-    'الوادى الجديد': 'New Valley',
-    'وادي': 'New Valley',
-    'وادى': 'New Valley',
-    'الوادي': 'New Valley',
-    'الوادى': 'New Valley',
-    'الجديد': 'New Valley',
-    'جديد': 'New Valley',
-    'شمال سيناء': 'North Sinai',
-    'شمال سينا': 'North Sinai',
-    'شمال': 'North Sinai',
-    'الشمال': 'North Sinai',
-    'جنوب سيناء': 'South Sinai',
-    'جنوب سينا': 'South Sinai',
-    'جنوب': 'South Sinai',
-    'الجنوب': 'South Sinai',
-    'سيناء': 'North Sinai',
-    'سينا': 'North Sinai',
-    'السويس': 'Suez',
-    'سويس': 'Suez',
-    'قناة السويس': 'Suez',
-    'قناه السويس': 'Suez',
-    'القناة': 'Suez',
-    'القناه': 'Suez',
-    'الأقصر': 'Luxor',
-    'الاقصر': 'Luxor',
-    'أقصر': 'Luxor',
-    'اقصر': 'Luxor',
-    'الاسماعيلية': 'Ismailia',
-    'الاسماعيليه': 'Ismailia',
-    'الإسماعيلية': 'Ismailia',
-    'الإسماعيليه': 'Ismailia',
-    'الأسماعيلية': 'Ismailia',
-    'الأسماعيليه': 'Ismailia',
-    'اسماعيلية': 'Ismailia',
-    'اسماعيليه': 'Ismailia',
-    'إسماعيلية': 'Ismailia',
-    'إسماعيليه': 'Ismailia',
-    'أسماعيلية': 'Ismailia',
-    'أسماعيليه': 'Ismailia',
-    'الاسماعلية': 'Ismailia',
-    'الاسماعليه': 'Ismailia',
-    'الإسماعلية': 'Ismailia',
-    'الإسماعليه': 'Ismailia',
-    'الأسماعلية': 'Ismailia',
-    'الأسماعليه': 'Ismailia',
-    'اسماعلية': 'Ismailia',
-    'اسماعليه': 'Ismailia',
-    'إسماعلية': 'Ismailia',
-    'إسماعليه': 'Ismailia',
-    'أسماعلية': 'Ismailia',
-    'أسماعليه': 'Ismailia',
-    'مفقود': 'Null'
-}
-
-
 # Disable chrome notifications
 chrome_options = webdriver.ChromeOptions()
 prefs = {"profile.default_content_setting_values.notifications": 2}
@@ -413,15 +237,12 @@ def scrape_page(driver, page, limit=-1, endless_scroll=False, wait_time=20):
 
         scrapped_names_ar.append(missing_name)
 
-        # Getting the government (if exist)
-        found = False
-        for gov in EGYPT_GOVS:
-            if (post_content.find(gov) >= 0):
-                print("Found gov: {}".format(gov))
-                scrapped_govs_ar.append(gov)
-                found = True
-                break
-        if (found == False):
+        # Getting the government (if exist), the longest mention wins
+        gov = FB_GOV_MATCHER.find(post_content)
+        if gov is not None:
+            print("Found gov: {}".format(gov[0]))
+            scrapped_govs_ar.append(gov[0])
+        else:
             print("Gov Not Found")
             scrapped_govs_ar.append("مفقود")
 
@@ -436,7 +257,8 @@ def translate_content(contents, from_language='ar', to_language='en'):
     Translate the content (mostly: names, govs) list from one 
     language (mostly: 'ar') to another (mostly: 'en') using 
     translate open source library. 
-    Note: has daily limited times of usage. 
+    Note: has daily limited times of usage, so the words of all the
+    contents are deduplicated and translated once through the translation cache.
 
     Parameters
     ----------
@@ -453,12 +275,7 @@ def translate_content(contents, from_language='ar', to_language='en'):
         list of the translated content.
 
     """
-    from translate import Translator
-    translator = Translator(from_lang=from_language, to_lang=to_language)
-
-    contents_translated = []
-    for content in contents:
-        contents_translated.append(translator.translate(content))
+    contents_translated = get_cache().translate_many(contents, from_language, to_language)
 
     return contents_translated
 
@@ -479,15 +296,7 @@ def mapping_names_to_english(names):
         list of mapped names.
 
     """
-    names_mapped = []
-    for name in names:
-        mapped_name = ""
-        for c in name:
-            try:
-                mapped_name += ARABIC_MAPPING[c]
-            except:
-                mapped_name += c
-        names_mapped.append(mapped_name.title())
+    names_mapped = ARABIC_TRANSLITERATOR.transliterate_many(names)
 
     return names_mapped
 
@@ -495,7 +304,8 @@ def mapping_names_to_english(names):
 def mapping_govs_to_english(govs):
     """
     Mapping the Arabic govs to English using list of 
-    pre-written dict according to GOVS_MAPPING.
+    pre-written dict according to GOVS_MAPPING, any spelling variant
+    of a gov is found on its normalized form.
 
     Parameters
     ----------
@@ -510,11 +320,11 @@ def mapping_govs_to_english(govs):
     """
     govs_mapped = []
     for gov in govs:
-        try:
-            govs_mapped.append(GOVS_MAPPING[gov])
-        except:
+        gov_mapped = GOV_LOOKUP.get(gov)
+        if gov_mapped is None:
             print("Error while mapping")
-            govs_mapped.append(gov)
+            gov_mapped = gov
+        govs_mapped.append(gov_mapped)
 
     return govs_mapped
 